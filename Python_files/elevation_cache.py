@@ -0,0 +1,271 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / 'data' / 'elevation_cache'
+
+
+class ElevationTileCache:
+    """
+    On-disk elevation cache organised in square lat/lon tiles.
+
+    Every requested point is snapped to a global lattice of `cell_size_deg`
+    (1 arc-second by default, roughly the SRTM resolution used by
+    open-elevation). Lattice cells are grouped into tiles of `tile_size_deg`
+    degrees which are stored as float32 .npy arrays, with NaN marking cells
+    that were never fetched. Tiles are evicted least-recently-used first once
+    the cache directory grows beyond `max_bytes`.
+
+    Concurrent lookups are coalesced per lattice cell: a cell that another
+    thread is already fetching is not requested again, the lookup waits for
+    that fetch instead. Identical or overlapping assessments started at the
+    same time therefore share upstream requests.
+
+    Parameters:
+    - cache_dir: Directory where tiles are stored
+    - tile_size_deg: Side of a tile in degrees (default: 0.05°, ~5.5 km)
+    - cell_size_deg: Side of a lattice cell in degrees (default: 1 arc-second)
+    - max_bytes: Maximum size of the tiles on disk (default: 256 MB)
+    - max_tiles_in_memory: Number of decoded tiles kept in memory (default: 64)
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, tile_size_deg=0.05, cell_size_deg=1 / 3600,
+                 max_bytes=256 * 1024 * 1024, max_tiles_in_memory=64):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cell_size_deg = cell_size_deg
+        self.cells_per_tile = int(round(tile_size_deg / cell_size_deg))
+        self.max_bytes = max_bytes
+        self.max_tiles_in_memory = max_tiles_in_memory
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._lock = threading.Lock()
+        self._inflight = {}           # (row, col) -> Future of the fetch that claimed the cell
+        self._memory = OrderedDict()  # tile key -> np.ndarray, most recently used last
+        self._disk = OrderedDict()    # tile key -> size in bytes, most recently used last
+
+        # Rebuild the LRU order of the tiles already on disk from their access times
+        tiles_on_disk = []
+        for path in self.cache_dir.glob('tile_*.npy'):
+            key = self._key_from_path(path)
+            if key is not None:
+                stat = path.stat()
+                tiles_on_disk.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(tiles_on_disk):
+            self._disk[key] = size
+
+    def _tile_path(self, key):
+        return self.cache_dir / f"tile_{key[0]}_{key[1]}.npy"
+
+    @staticmethod
+    def _key_from_path(path):
+        try:
+            _, tile_i, tile_j = path.stem.split('_')
+            return int(tile_i), int(tile_j)
+        except ValueError:
+            return None
+
+    def quantize(self, lats, lons):
+        """
+        Snap coordinates to the cache lattice.
+
+        Returns:
+        - Global integer row and column indices of the lattice cells
+        """
+        rows = np.rint(np.asarray(lats, dtype=float) / self.cell_size_deg).astype(np.int64)
+        cols = np.rint(np.asarray(lons, dtype=float) / self.cell_size_deg).astype(np.int64)
+        return rows, cols
+
+    def _load_tile(self, key):
+        # Must be called with the lock held
+        tile = self._memory.get(key)
+        if tile is not None:
+            self._memory.move_to_end(key)
+        else:
+            path = self._tile_path(key)
+            if key in self._disk and path.exists():
+                tile = np.load(path)
+            else:
+                self._disk.pop(key, None)
+                tile = np.full((self.cells_per_tile, self.cells_per_tile), np.nan, dtype=np.float32)
+            self._memory[key] = tile
+            while len(self._memory) > self.max_tiles_in_memory:
+                self._memory.popitem(last=False)
+
+        if key in self._disk:
+            self._disk.move_to_end(key)
+        return tile
+
+    def _save_tile(self, key, tile):
+        # Must be called with the lock held
+        path = self._tile_path(key)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, tile)
+        os.replace(tmp_path, path)
+        self._disk[key] = path.stat().st_size
+        self._disk.move_to_end(key)
+        self._evict()
+
+    def _touch(self, key):
+        try:
+            os.utime(self._tile_path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = sum(self._disk.values())
+        while total > self.max_bytes and len(self._disk) > 1:
+            key, size = self._disk.popitem(last=False)
+            self._memory.pop(key, None)
+            try:
+                self._tile_path(key).unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _gather(self, rows, cols):
+        # Must be called with the lock held
+        values = np.full(rows.shape, np.nan, dtype=np.float32)
+        tile_rows, tile_cols = rows // self.cells_per_tile, cols // self.cells_per_tile
+        tile_keys = np.stack([tile_rows, tile_cols], axis=1)
+        for tile_i, tile_j in np.unique(tile_keys, axis=0):
+            key = (int(tile_i), int(tile_j))
+            in_tile = (tile_rows == tile_i) & (tile_cols == tile_j)
+            tile = self._load_tile(key)
+            values[in_tile] = tile[rows[in_tile] % self.cells_per_tile, cols[in_tile] % self.cells_per_tile]
+            self._touch(key)
+        return values
+
+    def _store(self, rows, cols, values):
+        # Must be called with the lock held
+        tile_rows, tile_cols = rows // self.cells_per_tile, cols // self.cells_per_tile
+        tile_keys = np.stack([tile_rows, tile_cols], axis=1)
+        for tile_i, tile_j in np.unique(tile_keys, axis=0):
+            key = (int(tile_i), int(tile_j))
+            in_tile = (tile_rows == tile_i) & (tile_cols == tile_j)
+            tile = self._load_tile(key)
+            tile[rows[in_tile] % self.cells_per_tile, cols[in_tile] % self.cells_per_tile] = values[in_tile]
+            self._save_tile(key, tile)
+
+    def get_elevations(self, lats, lons, fetch):
+        """
+        Look up elevations, fetching only the lattice cells missing from the cache.
+
+        Parameters:
+        - lats, lons: Arrays of coordinates (any matching shape)
+        - fetch: Callable taking 1-D latitude and longitude arrays and returning
+          the elevations of those points. It is only called for cache misses.
+
+        Returns:
+        - numpy.ndarray of elevations with the same shape as `lats`
+        """
+        lats = np.asarray(lats, dtype=float)
+        shape = lats.shape
+        rows, cols = self.quantize(lats.ravel(), np.asarray(lons, dtype=float).ravel())
+
+        # Several points of a fine grid can fall in the same lattice cell
+        cells, inverse = np.unique(np.stack([rows, cols], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        cell_rows, cell_cols = cells[:, 0], cells[:, 1]
+
+        with self._lock:
+            values = self._gather(cell_rows, cell_cols)
+            missing = np.flatnonzero(np.isnan(values))
+
+            # Claim the missing cells nobody is fetching yet, wait for the others
+            claimed, waiting = [], {}
+            batch = Future()
+            for index in missing:
+                key = (int(cell_rows[index]), int(cell_cols[index]))
+                future = self._inflight.get(key)
+                if future is None:
+                    self._inflight[key] = batch
+                    claimed.append(index)
+                else:
+                    waiting.setdefault(future, []).append(index)
+        claimed = np.array(claimed, dtype=np.int64)
+
+        if claimed.size:
+            claimed_keys = list(zip(cell_rows[claimed].tolist(), cell_cols[claimed].tolist()))
+            try:
+                fetched = np.asarray(fetch(cell_rows[claimed] * self.cell_size_deg,
+                                           cell_cols[claimed] * self.cell_size_deg), dtype=np.float32)
+                with self._lock:
+                    self._store(cell_rows[claimed], cell_cols[claimed], fetched)
+            except BaseException as e:
+                batch.set_exception(e)
+                raise
+            else:
+                batch.set_result(dict(zip(claimed_keys, fetched.tolist())))
+                values[claimed] = fetched
+            finally:
+                with self._lock:
+                    for key in claimed_keys:
+                        self._inflight.pop(key, None)
+
+        n_coalesced = 0
+        for future, indices in waiting.items():
+            shared = future.result()
+            for index in indices:
+                values[index] = shared[(int(cell_rows[index]), int(cell_cols[index]))]
+            n_coalesced += len(indices)
+
+        n_missing_points = int(np.count_nonzero(np.isin(inverse, missing)))
+        with self._lock:
+            self.hits += inverse.size - n_missing_points
+            self.misses += n_missing_points
+            self.coalesced += n_coalesced
+
+        return values[inverse].astype(float).reshape(shape)
+
+    def stats(self):
+        """
+        Returns:
+        - dict with hit/miss counters and the current size of the cache
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': self.hits / total if total else 0.0,
+                'tiles_on_disk': len(self._disk),
+                'bytes_on_disk': sum(self._disk.values()),
+                'tiles_in_memory': len(self._memory),
+            }
+
+    def clear(self):
+        """Remove every cached tile and reset the counters."""
+        with self._lock:
+            for key in list(self._disk):
+                try:
+                    self._tile_path(key).unlink()
+                except FileNotFoundError:
+                    pass
+            self._disk.clear()
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Return the process-wide elevation cache, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ElevationTileCache()
+        return _default_cache
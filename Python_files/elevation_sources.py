@@ -0,0 +1,233 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .elevation_cache import get_default_cache
+from .open_elevation import DEFAULT_BATCH_SIZE, DEFAULT_MAX_WORKERS, ElevationClient
+
+
+class ElevationSource:
+    """
+    Interface of the elevation backends used by get_terrain_data.
+
+    Subclasses implement `get_elevations(lats, lons)`, which receives arrays of
+    coordinates of any matching shape and returns elevations (m) with the same
+    shape. Points a backend cannot answer are returned as NaN; get_terrain_grid
+    reports them as degraded and fills them with synthetic terrain.
+    """
+
+    def get_elevations(self, lats, lons):
+        raise NotImplementedError
+
+
+class OpenElevationSource(ElevationSource):
+    """
+    Elevations from an open-elevation compatible HTTP API, behind the tile cache.
+
+    Parameters:
+    - url: Lookup endpoint (default: public open-elevation API)
+    - batch_size: Maximum number of points per request
+    - max_workers: Number of concurrent requests
+    - cache: ElevationTileCache to use, None for the shared cache or False to disable caching
+    - client: ElevationClient to use instead of one built from the options above
+    """
+
+    def __init__(self, url=None, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS, cache=None,
+                 client=None):
+        self.client = client or ElevationClient(url=url, batch_size=batch_size, max_workers=max_workers)
+        self.cache = get_default_cache() if cache is None else cache
+
+    def get_elevations(self, lats, lons):
+        lats = np.asarray(lats, dtype=float)
+        if self.cache:
+            return self.cache.get_elevations(lats, lons, self.client.fetch)
+        return self.client.fetch(lats.ravel(), np.asarray(lons, dtype=float).ravel()).reshape(lats.shape)
+
+
+class _DEMTile:
+    """
+    A north-up DEM raster whose corner pixels are centred on the tile bounds
+    (pixel-is-point, as in SRTM .hgt files).
+    """
+
+    def __init__(self, path, min_lat, max_lat, min_lon, max_lon, fmt, nodata=None, dtype=None, shape=None):
+        self.path = Path(path)
+        self.min_lat, self.max_lat = min_lat, max_lat
+        self.min_lon, self.max_lon = min_lon, max_lon
+        self.fmt = fmt
+        self.nodata = nodata
+        self.dtype = dtype
+        self.shape = shape
+
+    def contains(self, lats, lons):
+        return (lats >= self.min_lat) & (lats <= self.max_lat) & (lons >= self.min_lon) & (lons <= self.max_lon)
+
+    def open(self):
+        """Return a lazily paged array view of the raster."""
+        if self.fmt == 'npy':
+            return np.load(self.path, mmap_mode='r')
+        if self.fmt == 'hgt':
+            size = int(round(np.sqrt(self.path.stat().st_size // 2)))
+            return np.memmap(self.path, dtype='>i2', mode='r', shape=(size, size))
+        if self.fmt == 'raw':
+            return np.memmap(self.path, dtype=self.dtype, mode='r', shape=tuple(self.shape))
+        if self.fmt == 'tif':
+            return _RasterioWindowReader(self.path)
+        raise ValueError(f"Unsupported DEM format: {self.fmt}")
+
+
+class _RasterioWindowReader:
+    """Minimal array-like wrapper giving windowed reads of a GeoTIFF band."""
+
+    def __init__(self, path):
+        try:
+            import rasterio
+        except ImportError as e:
+            raise ImportError("Reading GeoTIFF DEM tiles requires the optional 'rasterio' package") from e
+        self._dataset = rasterio.open(path)
+        self.shape = (self._dataset.height, self._dataset.width)
+
+    def __getitem__(self, key):
+        from rasterio.windows import Window
+        rows, cols = key
+        window = Window(cols.start, rows.start, cols.stop - cols.start, rows.stop - rows.start)
+        return self._dataset.read(1, window=window)
+
+
+_HGT_NAME = re.compile(r'^([NS])(\d{2})([EW])(\d{3})$', re.IGNORECASE)
+
+
+class LocalDEMSource(ElevationSource):
+    """
+    Elevations read from local DEM tiles through memory-mapped, windowed reads.
+
+    Only the pixels around the queried points are read, so a query costs a
+    slice of the tile instead of an HTTP round trip and memory stays flat no
+    matter how many tiles are on disk. Values are bilinearly interpolated.
+
+    Supported tiles inside `dem_dir`:
+    - SRTM .hgt files (raw big-endian int16), georeferenced by their name (e.g. S26W071.hgt)
+    - Any raster listed in an `index.json` file (see `write_dem_tile`): .npy arrays,
+      raw binary files (with "dtype" and "shape") or GeoTIFFs (requires rasterio)
+
+    Parameters:
+    - dem_dir: Directory containing the tiles
+    - max_open_tiles: Number of memory maps kept open at the same time
+    """
+
+    def __init__(self, dem_dir, max_open_tiles=32):
+        self.dem_dir = Path(dem_dir)
+        self.max_open_tiles = max_open_tiles
+        self.tiles = self._discover_tiles()
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _discover_tiles(self):
+        tiles = []
+        index_path = self.dem_dir / 'index.json'
+        if index_path.exists():
+            with open(index_path) as f:
+                for entry in json.load(f)['tiles']:
+                    path = self.dem_dir / entry['file']
+                    tiles.append(_DEMTile(path, entry['min_lat'], entry['max_lat'], entry['min_lon'],
+                                          entry['max_lon'], entry.get('format', path.suffix.lstrip('.')),
+                                          entry.get('nodata'), entry.get('dtype'), entry.get('shape')))
+
+        for path in sorted(self.dem_dir.glob('*.hgt')):
+            match = _HGT_NAME.match(path.stem)
+            if match is None:
+                continue
+            lat = int(match.group(2)) * (1 if match.group(1).upper() == 'N' else -1)
+            lon = int(match.group(4)) * (1 if match.group(3).upper() == 'E' else -1)
+            tiles.append(_DEMTile(path, lat, lat + 1, lon, lon + 1, 'hgt', nodata=-32768))
+        return tiles
+
+    def _raster(self, tile):
+        with self._lock:
+            raster = self._open.get(tile.path)
+            if raster is None:
+                raster = tile.open()
+                self._open[tile.path] = raster
+                while len(self._open) > self.max_open_tiles:
+                    self._open.popitem(last=False)
+            else:
+                self._open.move_to_end(tile.path)
+            return raster
+
+    def _sample_tile(self, tile, lats, lons):
+        raster = self._raster(tile)
+        n_rows, n_cols = raster.shape
+
+        # Fractional pixel coordinates, row 0 being the northern edge
+        rows = (tile.max_lat - lats) / (tile.max_lat - tile.min_lat) * (n_rows - 1)
+        cols = (lons - tile.min_lon) / (tile.max_lon - tile.min_lon) * (n_cols - 1)
+
+        # Read only the window that covers the points
+        row0 = int(np.clip(np.floor(rows.min()), 0, n_rows - 2))
+        col0 = int(np.clip(np.floor(cols.min()), 0, n_cols - 2))
+        row1 = int(np.clip(np.floor(rows.max()) + 2, row0 + 2, n_rows))
+        col1 = int(np.clip(np.floor(cols.max()) + 2, col0 + 2, n_cols))
+        window = np.asarray(raster[row0:row1, col0:col1], dtype=float)
+        if tile.nodata is not None:
+            window[window == tile.nodata] = np.nan
+
+        r = np.clip(rows - row0, 0, window.shape[0] - 1)
+        c = np.clip(cols - col0, 0, window.shape[1] - 1)
+        r0 = np.minimum(np.floor(r).astype(int), window.shape[0] - 2)
+        c0 = np.minimum(np.floor(c).astype(int), window.shape[1] - 2)
+        fr, fc = r - r0, c - c0
+
+        top = window[r0, c0] * (1 - fc) + window[r0, c0 + 1] * fc
+        bottom = window[r0 + 1, c0] * (1 - fc) + window[r0 + 1, c0 + 1] * fc
+        return top * (1 - fr) + bottom * fr
+
+    def get_elevations(self, lats, lons):
+        lats = np.asarray(lats, dtype=float)
+        shape = lats.shape
+        lats = lats.ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+
+        # Points outside every tile stay NaN
+        elevations = np.full(lats.size, np.nan)
+        pending = np.ones(lats.size, dtype=bool)
+        for tile in self.tiles:
+            in_tile = pending & tile.contains(lats, lons)
+            if np.any(in_tile):
+                elevations[in_tile] = self._sample_tile(tile, lats[in_tile], lons[in_tile])
+                pending &= ~in_tile
+        return elevations.reshape(shape)
+
+
+def write_dem_tile(dem_dir, name, elevation, min_lat, max_lat, min_lon, max_lon, nodata=None):
+    """
+    Store a north-up elevation array as a .npy tile and register it in `index.json`.
+
+    Parameters:
+    - dem_dir: Directory of the LocalDEMSource
+    - name: File name of the tile (without extension)
+    - elevation: 2-D array, row 0 at `max_lat`, column 0 at `min_lon`
+    - min_lat, max_lat, min_lon, max_lon: Coordinates of the corner pixel centres
+    - nodata: Value marking missing pixels, if any
+    """
+    dem_dir = Path(dem_dir)
+    dem_dir.mkdir(parents=True, exist_ok=True)
+    file_name = f"{name}.npy"
+    np.save(dem_dir / file_name, np.asarray(elevation))
+
+    index_path = dem_dir / 'index.json'
+    index = {'tiles': []}
+    if index_path.exists():
+        with open(index_path) as f:
+            index = json.load(f)
+    index['tiles'] = [entry for entry in index['tiles'] if entry['file'] != file_name]
+    index['tiles'].append({
+        'file': file_name, 'format': 'npy',
+        'min_lat': min_lat, 'max_lat': max_lat, 'min_lon': min_lon, 'max_lon': max_lon,
+        'nodata': nodata,
+    })
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2)
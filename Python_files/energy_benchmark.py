@@ -0,0 +1,91 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+from .energy_kernel import solar_energy_production
+from .get_energy import _calculate_solar_energy_production
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _measure(fn, repeats):
+    """Best wall time over `repeats` runs and peak memory allocated by one run (bytes)."""
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+
+    # numpy reports its buffers to tracemalloc
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(durations), peak
+
+
+def run_energy_benchmark(sizes=DEFAULT_SIZES, latitude=-25.5, repeats=3, seed=0):
+    """
+    Compare the fused energy kernel with _calculate_solar_energy_production.
+
+    Inputs are random terrain (slope 0-45°, any aspect) and irradiance. The
+    kernel is run in float64 into a new array, in float64 into a reused `out`
+    buffer and in float32. Peak memory counts every allocation made by the call,
+    the output included.
+
+    Parameters:
+    - sizes: Numbers of points to evaluate
+    - latitude: Latitude passed to both implementations
+    - repeats: Runs per measurement (the fastest one is reported)
+    - seed: Seed of the random inputs
+
+    Returns:
+    - list of dicts, one per size, with times (s), peak memory (MB), speedups and the maximum
+      absolute difference from the reference
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        size = int(size)
+        irradiance = rng.uniform(3, 7, size)
+        slope = rng.uniform(0, 45, size)
+        aspect = rng.uniform(0, 360, size)
+        out = np.empty(size)
+
+        reference = _calculate_solar_energy_production(irradiance, slope, aspect, latitude)
+        runs = {
+            'reference': lambda: _calculate_solar_energy_production(irradiance, slope, aspect, latitude),
+            'fused': lambda: solar_energy_production(irradiance, slope, aspect, latitude),
+            'fused_out': lambda: solar_energy_production(irradiance, slope, aspect, latitude, out=out),
+            'fused_float32': lambda: solar_energy_production(irradiance, slope, aspect, latitude, dtype=np.float32),
+        }
+        row = {'points': size}
+        for name, fn in runs.items():
+            duration, peak = _measure(fn, repeats)
+            row[f'{name}_s'] = duration
+            row[f'{name}_mb'] = peak / 1e6
+        for name in ('fused', 'fused_out', 'fused_float32'):
+            row[f'{name}_speedup'] = row['reference_s'] / row[f'{name}_s']
+        row['max_abs_error'] = float(np.max(np.abs(solar_energy_production(irradiance, slope, aspect, latitude)
+                                                   - reference)))
+        row['max_abs_error_float32'] = float(np.max(np.abs(
+            solar_energy_production(irradiance, slope, aspect, latitude, dtype=np.float32) - reference)))
+        results.append(row)
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the fused energy kernel against the reference model")
+    parser.add_argument('--sizes', type=float, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    for row in run_energy_benchmark(sizes=args.sizes, repeats=args.repeats):
+        print(f"{row['points']:>10,d} points: reference {row['reference_s']:.4f} s / {row['reference_mb']:.1f} MB, "
+              f"fused {row['fused_s']:.4f} s / {row['fused_mb']:.1f} MB (x{row['fused_speedup']:.1f}), "
+              f"out= {row['fused_out_s']:.4f} s / {row['fused_out_mb']:.1f} MB, "
+              f"float32 {row['fused_float32_s']:.4f} s / {row['fused_float32_mb']:.1f} MB, "
+              f"max error {row['max_abs_error']:.1e} (float32 {row['max_abs_error_float32']:.1e})")
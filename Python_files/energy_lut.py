@@ -0,0 +1,254 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .energy_kernel import DEFAULT_CHUNK_SIZE
+from .irradiance_store import DATA_DIR
+
+DEFAULT_LUT_DIR = DATA_DIR / 'energy_lut'
+# Bump when the energy model changes so cached tables are rebuilt
+MODEL_VERSION = 1
+
+# Domain (degrees) and largest derivative (per degree) of each tabulated factor
+_SLOPE_FACTOR_DOMAIN = (-90.0, 90.0)    # slope - |latitude|
+_TILT_WEIGHT_DOMAIN = (0.0, 90.0)       # slope
+_ASPECT_LOSS_DOMAIN = (0.0, 540.0)      # aspect, + 180 in the northern hemisphere
+_MAX_DERIVATIVES = {
+    'slope_factor': 0.8 * np.pi / 180,  # d/dx cos(0.8 x)
+    'tilt_weight': 1 / 15.0,            # d/ds tanh(s / 15)
+    'aspect_loss': np.pi / 180,         # d/da (1 - max(cos a, 0.1))
+}
+
+
+def _tabulate(name, step):
+    low, high = {'slope_factor': _SLOPE_FACTOR_DOMAIN, 'tilt_weight': _TILT_WEIGHT_DOMAIN,
+                 'aspect_loss': _ASPECT_LOSS_DOMAIN}[name]
+    x = np.arange(int(np.ceil((high - low) / step)) + 1) * step + low
+    if name == 'slope_factor':
+        return np.cos(np.radians(0.8 * x))
+    if name == 'tilt_weight':
+        return np.tanh(x / 15.0)
+    return 1 - np.maximum(np.cos(np.radians(x)), 0.1)
+
+
+class EnergyFactorLUT:
+    """
+    Lookup tables of the terrain factors of the energy model.
+
+    The factor applied to the irradiance separates into three functions of
+    one variable:
+        slope_factor(slope - |latitude|) * (1 - 0.8 * tilt_weight(slope) * aspect_loss(aspect'))
+    with slope_factor = cos(0.8 x), tilt_weight = tanh(s / 15),
+    aspect_loss = 1 - max(cos a, 0.1), and aspect' = aspect in the southern
+    hemisphere and aspect + 180° in the northern one. Each is tabulated in
+    1-D and read at the nearest node, so evaluating a point is three gathers
+    and a few multiplications. This replaces one 2-D table per latitude band
+    without any latitude quantisation.
+
+    Table size grows as 1 / max_error: about 22 KB at 1e-2, 218 KB at the
+    default 1e-3 (within a typical L2 cache) and 2.2 MB at 1e-4, which no
+    longer fits in L2 and gathers from L3 or memory.
+
+    Node spacings come from the largest derivative of each function, so that
+    the combined factor is within `max_error` of the analytic one. Energy is
+    then within max_error * irradiance * efficiency * area of
+    solar_energy_production. Slopes outside [0°, 90°] are clamped.
+
+    Tables are cached on disk in `lut_dir`, keyed by the error bound and the
+    model version.
+
+    Parameters:
+    - max_error: Bound on the absolute error of the combined factor (dimensionless)
+    - lut_dir: Cache directory (None to disable the disk cache)
+    """
+
+    def __init__(self, max_error=1e-3, lut_dir=DEFAULT_LUT_DIR):
+        self.max_error = max_error
+        # The error of the product is at most e_slope + 0.8 * (e_tilt + e_aspect), as every factor is <= 1
+        errors = {'slope_factor': max_error / 2, 'tilt_weight': max_error / 3.2, 'aspect_loss': max_error / 3.2}
+        # Nearest-node lookup is off by at most step / 2 * max |f'|
+        self.steps = {name: 2 * errors[name] / _MAX_DERIVATIVES[name] for name in errors}
+
+        path = None if lut_dir is None else Path(lut_dir) / f"energy_lut_v{MODEL_VERSION}_{max_error:g}.npz"
+        if path is not None and path.exists():
+            with np.load(path) as tables:
+                self.tables = {name: tables[name] for name in self.steps}
+            return
+
+        self.tables = {name: _tabulate(name, step) for name, step in self.steps.items()}
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + '.tmp.npz')
+            np.savez(tmp_path, **self.tables)
+            tmp_path.replace(path)
+
+    @property
+    def nbytes(self):
+        return sum(table.nbytes for table in self.tables.values())
+
+    def factor(self, slope, aspect, latitude, out=None):
+        """Combined terrain factor (slope factor x aspect factor) of each point."""
+        return self.energy(1.0, slope, aspect, latitude, panel_efficiency=1.0, panel_area=1.0, out=out)
+
+    def energy(self, irradiance, slope, aspect, latitude, panel_efficiency=0.2, panel_area=1.0, out=None,
+               chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Energy production (W) read from the tables.
+
+        Same arguments as energy_kernel.solar_energy_production; evaluated
+        chunk by chunk in preallocated buffers.
+        """
+        shape = np.broadcast_shapes(np.shape(irradiance), np.shape(slope), np.shape(aspect), np.shape(latitude))
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape or not out.flags.c_contiguous:
+            raise ValueError(f"out must be a C-contiguous array of shape {shape}")
+
+        def flat(x):
+            return np.broadcast_to(x, shape).reshape(-1)
+
+        irradiance, slope, aspect, latitude = flat(irradiance), flat(slope), flat(aspect), flat(latitude)
+        out_flat = out.reshape(-1)
+        scale = panel_efficiency * panel_area
+        slope_table, tilt_table, aspect_table = (self.tables[name] for name in
+                                                 ('slope_factor', 'tilt_weight', 'aspect_loss'))
+        slope_step, tilt_step, aspect_step = (self.steps[name] for name in
+                                              ('slope_factor', 'tilt_weight', 'aspect_loss'))
+
+        n = out_flat.size
+        chunk_size = min(chunk_size, max(n, 1))
+        x = np.empty(chunk_size)
+        weight = np.empty(chunk_size)
+        index = np.empty(chunk_size, dtype=np.intp)
+        northern = np.empty(chunk_size, dtype=bool)
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            chunk = slice(start, stop)
+            m = stop - start
+            xc, wc, ic, nc, o = x[:m], weight[:m], index[:m], northern[:m], out_flat[chunk]
+            s, lat = slope[chunk], latitude[chunk]
+
+            # Nearest node: index = (value - low) / step + 0.5, truncated; out-of-range indices are clipped
+            np.abs(lat, out=xc)
+            np.subtract(s, xc, out=xc)
+            np.multiply(xc, 1 / slope_step, out=xc)
+            np.add(xc, -_SLOPE_FACTOR_DOMAIN[0] / slope_step + 0.5, out=xc)
+            np.copyto(ic, xc, casting='unsafe')
+            np.take(slope_table, ic, out=o, mode='clip')
+
+            np.multiply(s, 1 / tilt_step, out=xc)
+            np.add(xc, 0.5, out=xc)
+            np.copyto(ic, xc, casting='unsafe')
+            np.take(tilt_table, ic, out=wc, mode='clip')
+
+            np.greater(lat, 0, out=nc)
+            np.copyto(xc, aspect[chunk])
+            np.add(xc, 180.0, out=xc, where=nc)
+            np.multiply(xc, 1 / aspect_step, out=xc)
+            np.add(xc, 0.5, out=xc)
+            np.copyto(ic, xc, casting='unsafe')
+            np.take(aspect_table, ic, out=xc, mode='clip')
+
+            # slope_factor * (1 - 0.8 * tilt_weight * aspect_loss) * irradiance * scale
+            np.multiply(wc, xc, out=wc)
+            np.multiply(wc, -0.8, out=wc)
+            np.add(wc, 1.0, out=wc)
+            np.multiply(o, wc, out=o)
+            np.multiply(o, irradiance[chunk], out=o)
+            np.multiply(o, scale, out=o)
+        return out
+
+
+_luts = {}
+_luts_lock = threading.Lock()
+
+
+def get_energy_lut(max_error=1e-3) -> EnergyFactorLUT:
+    """Process-wide EnergyFactorLUT for an error bound, built or loaded on first use."""
+    with _luts_lock:
+        lut = _luts.get(max_error)
+        if lut is None:
+            lut = EnergyFactorLUT(max_error)
+            _luts[max_error] = lut
+        return lut
+
+
+def run_lut_benchmark(sizes=(1e4, 1e5, 1e6, 1e7), max_errors=(1e-2, 1e-3, 1e-4), repeats=3, seed=0):
+    """
+    Compare EnergyFactorLUT with the analytic fused kernel.
+
+    Inputs are random terrain (slope 0-60°, any aspect, latitude -60° to 20°)
+    and irradiance.
+
+    Returns:
+    - list of dicts with table size, times (s), speedup and the largest factor error observed
+    """
+    import tempfile
+    import time
+
+    from .energy_kernel import solar_energy_production
+
+    def best_time(fn):
+        durations = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            durations.append(time.perf_counter() - start)
+        return min(durations)
+
+    rng = np.random.default_rng(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as lut_dir:
+        for max_error in max_errors:
+            lut = EnergyFactorLUT(max_error, lut_dir=lut_dir)
+            for size in sizes:
+                size = int(size)
+                irradiance = rng.uniform(3, 7, size)
+                slope = rng.uniform(0, 60, size)
+                aspect = rng.uniform(0, 360, size)
+                latitude = rng.uniform(-60, 20, size)
+                out = np.empty(size)
+
+                analytic = solar_energy_production(irradiance, slope, aspect, latitude)
+                analytic_s = best_time(lambda: solar_energy_production(irradiance, slope, aspect, latitude, out=out))
+                lut_s = best_time(lambda: lut.energy(irradiance, slope, aspect, latitude, out=out))
+                results.append({
+                    'max_error': max_error, 'points': size, 'table_kb': lut.nbytes / 1e3,
+                    'analytic_s': analytic_s, 'lut_s': lut_s, 'speedup': analytic_s / lut_s,
+                    'observed_error': float(np.max(np.abs(out - analytic) / (irradiance * 0.2))),
+                })
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the energy lookup tables against the analytic model")
+    parser.add_argument('--sizes', type=float, nargs='+', default=(1e4, 1e5, 1e6, 1e7))
+    parser.add_argument('--max-error', type=float, nargs='+', default=(1e-2, 1e-3, 1e-4))
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    for row in run_lut_benchmark(args.sizes, args.max_error, args.repeats):
+        print(f"max_error {row['max_error']:g} ({row['table_kb']:.0f} KB), {row['points']:>10,d} points: "
+              f"analytic {row['analytic_s']:.4f} s, LUT {row['lut_s']:.4f} s (x{row['speedup']:.2f}), "
+              f"observed error {row['observed_error']:.1e}")
+
+    # Planes facing each cardinal direction, with the aspect derived from their elevations: the
+    # equator-facing one must produce the most in both hemispheres, in the tables and the kernel
+    from .energy_kernel import solar_energy_scenarios
+    from .slope_aspect_engine import METERS_PER_DEGREE, compute_slope_aspect
+
+    lut = get_energy_lut()
+    north, east = np.meshgrid(np.arange(8) * 100.0, np.arange(8) * 100.0, indexing='ij')
+    for latitude in (-30, 30):
+        plane_lats = latitude + np.arange(8) * 100 / METERS_PER_DEGREE
+        plane_lons = -70 + np.arange(8) * 100 / METERS_PER_DEGREE / np.cos(np.radians(latitude))
+        for name, plane in (('north', -north), ('east', -east), ('south', north), ('west', east)):
+            slope, aspect = compute_slope_aspect(0.4 * plane, plane_lats, plane_lons)
+            slope, aspect = slope[4:5, 4], aspect[4:5, 4]
+            analytic = solar_energy_scenarios(5.5, slope, aspect, latitude, panel_efficiency=np.array([0.2, 0.15]))
+            tabulated = lut.energy(np.full(1, 5.5), slope, aspect, np.full(1, latitude))
+            print(f"{name}-facing {slope[0]:.0f}° slope at {latitude}°: aspect {aspect[0]:.0f}°, "
+                  f"{analytic[0, 0]:.4f} W (LUT {tabulated[0]:.4f} W, 15% panels {analytic[1, 0]:.4f} W)")
@@ -1,8 +1,19 @@
-from .get_slope_aspect import get_terrain_data
-from .get_irradiation import get_interpolated_irradiance_df
+from .energy_kernel import solar_energy_production, solar_energy_scenarios
+from .energy_lut import get_energy_lut
+from .get_slope_aspect import build_terrain_grid, get_elevation_source, get_terrain_grid, grid_axes
+from .horizon import terrain_shading
+from .irradiance_cube import MONTHS, load_irradiance_cube
+from .irradiance_tiles import lookup_irradiance
+from .singleflight import SingleFlight
+from .terrain_grid import TerrainGrid
+import calendar
+import io
+import threading
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
 
 
@@ -69,27 +80,174 @@ def _calculate_solar_energy_production(irradiance, slope, aspect, latitude, pane
     return energy_production
 
 
-raw_irradiance_data = pd.read_csv('data/irradiance_data_full_res2.csv')
+def get_energy_production_grid(min_lat=-26, max_lat=-25, min_lon=-71, max_lon=-70, resolution=30, refiner=None,
+                               shading=False, **kwargs) -> TerrainGrid:
+    """
+    Compute terrain, interpolated irradiance and energy production on a grid.
+
+    Extra keyword arguments are forwarded to get_terrain_grid.
+
+    Parameters:
+    - refiner: Optional IrradianceRefiner to interpolate irradiance with instead of the precomputed
+      tiles; a refinement around the area is scheduled in the background and changes the result
+      of the next queries nearby
+    - shading: Scale the energy by the terrain horizon shading factor (see horizon.terrain_shading);
+      the horizon also sees the terrain up to its ray length around the area
+
+    Returns:
+    - TerrainGrid with elevation, slope, aspect, irradiance and energy fields, plus shading if requested
+    """
+    source = get_elevation_source(**kwargs)
+    grid = get_terrain_grid(min_lat, max_lat, min_lon, max_lon, resolution=resolution, elevation_source=source)
+
+    if refiner is not None:
+        refiner.schedule((min_lat + max_lat) / 2, (min_lon + max_lon) / 2)
+        grid.irradiance = refiner(grid.lat_grid, grid.lon_grid)
+    else:
+        grid.irradiance = lookup_irradiance(grid.lat_grid, grid.lon_grid)
 
-def get_energy_production_df(min_lat=-26, max_lat=-25, min_lon=-71, max_lon=-70, resolution=30) -> pd.DataFrame:
-    terrain_data = get_terrain_data(min_lat, max_lat, min_lon, max_lon, resolution=resolution)
+    # Calculate energy production with improved model, using the latitude of each point for the optimal tilt
+    grid.energy = solar_energy_production(grid.irradiance, grid.slope, grid.aspect, grid.lats[:, None])
+    if shading:
+        _, grid.shading = terrain_shading(grid, elevation_source=source)
+        grid.energy = grid.energy * grid.shading
+    return grid
 
-    irradiance_data = get_interpolated_irradiance_df(raw_irradiance_data, terrain_data)
 
-    # Extract slope and aspect from the terrain dataframe
-    slope = terrain_data['slope'].values
-    aspect = terrain_data['aspect'].values
+_energy_grid_flights = SingleFlight()
 
-    # Use mean latitude from the dataset for optimal tilt calculation
-    mean_latitude = (terrain_data['latitude'].min() + terrain_data['latitude'].max()) / 2
 
-    # Calculate energy production with improved model
-    # Extract the irradiance values from the DataFrame
-    irradiance_values = irradiance_data['irradiance'].values  # Replace 'irradiance' with actual column name
-    energy_production = _calculate_solar_energy_production(irradiance_values, slope, aspect, mean_latitude)
+def get_energy_production_grid_coalesced(min_lat=-26, max_lat=-25, min_lon=-71, max_lon=-70, resolution=30,
+                                         **kwargs) -> TerrainGrid:
+    """
+    get_energy_production_grid shared between concurrent identical calls.
+
+    When several sessions request the same area at the same time, only one of
+    them runs the pipeline and every caller receives that same TerrainGrid,
+    which must therefore be treated as read-only.
+    """
+    key = (round(min_lat, 6), round(max_lat, 6), round(min_lon, 6), round(max_lon, 6), resolution,
+           tuple(sorted(kwargs.items())))
+    return _energy_grid_flights.do(key, lambda: get_energy_production_grid(
+        min_lat, max_lat, min_lon, max_lon, resolution=resolution, **kwargs))
+
+
+def get_energy_production_df(min_lat=-26, max_lat=-25, min_lon=-71, max_lon=-70, resolution=30, monthly=False,
+                             year=None, cube=None, **kwargs) -> pd.DataFrame:
+    """
+    Energy production of an area as a flat DataFrame.
+
+    Parameters:
+    - min_lat, max_lat, min_lon, max_lon: Bounds of the area
+    - resolution: Resolution in meters
+    - monthly: Add one "Energy Production <Mon> (W)" column per month, computed from the
+      monthly irradiance cube (only the cube window around the area is read), which must have
+      been built with `python -m Python_files.irradiance_cube`
+    - year: Year of the monthly irradiance (default: mean of the years in the cube)
+    - cube: IrradianceCube to use (default: data/irradiance_cube, FileNotFoundError if missing)
+    - kwargs: Elevation options of get_terrain_grid
+    """
+    grid = get_energy_production_grid(min_lat, max_lat, min_lon, max_lon, resolution=resolution, **kwargs)
+    df = grid.to_dataframe(['slope', 'aspect', 'energy'])
+    if not monthly:
+        return df
+
+    cube = cube or load_irradiance_cube()
+    monthly_irradiance = cube.interpolate(grid.lat_grid, grid.lon_grid, year=year)
+    energy = np.empty(grid.shape)
+    for month in MONTHS:
+        solar_energy_production(monthly_irradiance[:, :, month - 1], grid.slope, grid.aspect, grid.lats[:, None],
+                                out=energy)
+        df[f"Energy Production {calendar.month_abbr[month]} (W)"] = energy.ravel()
+    return df
+
+
+def get_energy_production_scenarios(min_lat=-26, max_lat=-25, min_lon=-71, max_lon=-70, resolution=30,
+                                    panel_efficiency=0.2, panel_area=1.0, tilt_scale=1.0, tilt_offset=0.0,
+                                    **kwargs) -> np.ndarray:
+    """
+    Energy production of an area under several panel scenarios.
+
+    Terrain and irradiance are computed once; the scenario parameters are
+    broadcast against each other and evaluated in a single pass by
+    solar_energy_scenarios.
+
+    Parameters:
+    - min_lat, max_lat, min_lon, max_lon: Bounds of the area
+    - resolution: Resolution in meters
+    - panel_efficiency, panel_area: Scalars or 1-D arrays of scenario parameters
+    - tilt_scale, tilt_offset: Tilt policy of each scenario, optimal tilt = tilt_scale * |lat| + tilt_offset
+    - kwargs: Options of get_energy_production_grid
+
+    Returns:
+    - numpy.ndarray of shape (scenarios, len(lats), len(lons)) in Watts
+    """
+    grid = get_energy_production_grid(min_lat, max_lat, min_lon, max_lon, resolution=resolution, **kwargs)
+    return solar_energy_scenarios(grid.irradiance, grid.slope, grid.aspect, grid.lats[:, None],
+                                  panel_efficiency=panel_efficiency, panel_area=panel_area, tilt_scale=tilt_scale,
+                                  tilt_offset=tilt_offset)
+
+
+def iter_energy_production(min_lat=-26, max_lat=-25, min_lon=-71, max_lon=-70, resolution=30, tile_size=256,
+                           as_dataframe=True, max_factor_error=None, **kwargs):
+    """
+    Stream terrain, irradiance and energy production over a large area tile by tile.
+
+    The area is sampled on the same grid as get_energy_production_grid and cut
+    into tiles of `tile_size` x `tile_size` points. Each tile is computed with a
+    one-point halo, so slopes along tile edges match the untiled result, and is
+    yielded as soon as it is ready. Peak memory stays at about one tile.
+
+    Parameters:
+    - min_lat, max_lat, min_lon, max_lon: Bounds of the area
+    - resolution: Resolution in meters
+    - tile_size: Number of points per tile side
+    - as_dataframe: Yield DataFrames (default) or TerrainGrid objects
+    - max_factor_error: Read the terrain factors from lookup tables accurate to this bound
+      (see energy_lut.EnergyFactorLUT) instead of evaluating the analytic model
+    - kwargs: Elevation options of get_terrain_grid (use_cache, max_workers, elevation_source, ...)
+
+    Yields:
+    - One DataFrame (latitude, longitude, slope, aspect, irradiance, Energy Production (W)) or TerrainGrid per tile
+    """
+    lats, lons = grid_axes(min_lat, max_lat, min_lon, max_lon, resolution)
+    source = get_elevation_source(**kwargs)
+    lut = get_energy_lut(max_factor_error) if max_factor_error is not None else None
 
-    terrain_data['Energy Production (W)'] = energy_production
-    return terrain_data
+    for row0 in range(0, lats.size, tile_size):
+        row1 = min(row0 + tile_size, lats.size)
+        for col0 in range(0, lons.size, tile_size):
+            col1 = min(col0 + tile_size, lons.size)
+
+            halo_row0, halo_row1 = max(row0 - 1, 0), min(row1 + 1, lats.size)
+            halo_col0, halo_col1 = max(col0 - 1, 0), min(col1 + 1, lons.size)
+            halo_grid = build_terrain_grid(lats[halo_row0:halo_row1], lons[halo_col0:halo_col1], source)
+            grid = halo_grid.window(slice(row0 - halo_row0, row1 - halo_row0),
+                                    slice(col0 - halo_col0, col1 - halo_col0))
+
+            grid.irradiance = lookup_irradiance(grid.lat_grid, grid.lon_grid)
+            if lut is not None:
+                grid.energy = lut.energy(grid.irradiance, grid.slope, grid.aspect, grid.lats[:, None])
+            else:
+                grid.energy = solar_energy_production(grid.irradiance, grid.slope, grid.aspect, grid.lats[:, None])
+
+            yield grid.to_dataframe(['slope', 'aspect', 'irradiance', 'energy']) if as_dataframe else grid
+
+
+def write_energy_production_csv(path, min_lat=-26, max_lat=-25, min_lon=-71, max_lon=-70, resolution=30, **kwargs):
+    """
+    Write the energy production of a large area to a CSV file while it is being computed.
+
+    Takes the same parameters as iter_energy_production.
+
+    Returns:
+    - Number of rows written
+    """
+    n_rows = 0
+    for chunk in iter_energy_production(min_lat, max_lat, min_lon, max_lon, resolution, as_dataframe=True, **kwargs):
+        chunk.to_csv(path, mode='w' if n_rows == 0 else 'a', header=n_rows == 0, index=False)
+        n_rows += len(chunk)
+    return n_rows
 
 
 def create_3_plots(terrain_df):
@@ -153,58 +311,122 @@ def create_information_plots(mean_latitude=-45, save_fig=False):
     aspects = np.linspace(0, 359, 36)  # Different aspects all around
     slope_grid, aspect_grid = np.meshgrid(slopes, aspects)
 
-    # Calculate energy for each combination
-    energy_grid = np.zeros_like(slope_grid)
-    for i in range(len(aspects)):
-        for j in range(len(slopes)):
-            energy_grid[i, j] = _calculate_solar_energy_production(
-                1000, slopes[j], aspects[i], mean_latitude
-            )
+    # Calculate energy for each combination in one broadcast call
+    energy_grid = _calculate_solar_energy_production(1000, slope_grid, aspect_grid, mean_latitude)
 
     # Convert to relative values (percentage of maximum)
     energy_rel = energy_grid / np.max(energy_grid) * 100
 
+    # Figures are built without pyplot so they can be rendered from any thread and are not kept alive by pyplot
     # Create heatmap - Figure 1
-    fig1 = plt.figure(figsize=(12, 10))
-    im = plt.imshow(energy_rel, origin='lower', aspect='auto', cmap='hot',
-                extent=[0, 45, 0, 360])
-    plt.colorbar(im, label='Relative Energy Potential (%)')
-    plt.xlabel('Slope (degrees)')
-    plt.ylabel('Aspect (degrees)')
-    plt.title('Solar Energy Potential by Slope and Aspect')
-    plt.yticks([0, 45, 90, 135, 180, 225, 270, 315, 360], 
-            ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW', 'N'])
-    plt.grid(False)
+    fig1 = Figure(figsize=(12, 10))
+    ax1 = fig1.add_subplot()
+    im = ax1.imshow(energy_rel, origin='lower', aspect='auto', cmap='hot',
+                    extent=[0, 45, 0, 360])
+    fig1.colorbar(im, ax=ax1, label='Relative Energy Potential (%)')
+    ax1.set_xlabel('Slope (degrees)')
+    ax1.set_ylabel('Aspect (degrees)')
+    ax1.set_title('Solar Energy Potential by Slope and Aspect')
+    ax1.set_yticks([0, 45, 90, 135, 180, 225, 270, 315, 360],
+                   ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW', 'N'])
+    ax1.grid(False)
     if save_fig:
-        plt.savefig('images/slope_aspect_energy_matrix.png', dpi=300)
+        fig1.savefig('images/slope_aspect_energy_matrix.png', dpi=300)
 
     # Create line plot - Figure 2
-    fig2 = plt.figure(figsize=(10, 6))
+    fig2 = Figure(figsize=(10, 6))
+    ax2 = fig2.add_subplot()
     selected_slopes = [0, 5, 15, 30]
     for slp in selected_slopes:
         # Find the closest index in our slopes array
         slp_idx = np.abs(slopes - slp).argmin()
         energy_curve = energy_rel[:, slp_idx]
-        plt.plot(aspects, energy_curve, label=f'Slope = {slp}Â°')
-
-    plt.axvline(x=0, color='blue', linestyle='--', alpha=0.3)
-    plt.axvline(x=90, color='green', linestyle='--', alpha=0.3)
-    plt.axvline(x=180, color='red', linestyle='--', alpha=0.3)
-    plt.axvline(x=270, color='purple', linestyle='--', alpha=0.3)
-    plt.xlabel('Aspect (degrees)')
-    plt.ylabel('Relative Energy Potential (%)')
-    plt.title('Effect of Slope and Aspect on Solar Energy Production')
-    plt.xlim(0, 359)
-    plt.xticks([0, 45, 90, 135, 180, 225, 270, 315, 359], 
-            ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW', 'N'])
-    plt.legend()
-    plt.grid(True)
+        ax2.plot(aspects, energy_curve, label=f'Slope = {slp}Â°')
+
+    ax2.axvline(x=0, color='blue', linestyle='--', alpha=0.3)
+    ax2.axvline(x=90, color='green', linestyle='--', alpha=0.3)
+    ax2.axvline(x=180, color='red', linestyle='--', alpha=0.3)
+    ax2.axvline(x=270, color='purple', linestyle='--', alpha=0.3)
+    ax2.set_xlabel('Aspect (degrees)')
+    ax2.set_ylabel('Relative Energy Potential (%)')
+    ax2.set_title('Effect of Slope and Aspect on Solar Energy Production')
+    ax2.set_xlim(0, 359)
+    ax2.set_xticks([0, 45, 90, 135, 180, 225, 270, 315, 359],
+                   ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW', 'N'])
+    ax2.legend()
+    ax2.grid(True)
     if save_fig:
-        plt.savefig('images/slope_aspect_curves.png', dpi=300)
-    
+        fig2.savefig('images/slope_aspect_curves.png', dpi=300)
+
     return fig1, fig2  # Return both figures
 
 
+_information_plots = OrderedDict()
+_information_plots_lock = threading.Lock()
+_information_plot_flights = SingleFlight()
+# One entry per position of the Información latitude slider (-90..90)
+MAX_CACHED_INFORMATION_PLOTS = 181
+
+
+def render_information_plots(mean_latitude=-45, dpi=100):
+    """
+    PNG bytes of the two create_information_plots figures, cached per latitude.
+
+    Rendered images are kept in a bounded LRU, so moving the latitude slider
+    back to a seen position is a dictionary lookup. Concurrent requests for the
+    same latitude share one rendering.
+
+    Returns:
+    - (heatmap_png, curves_png) bytes
+    """
+    key = (round(float(mean_latitude), 3), dpi)
+    with _information_plots_lock:
+        images = _information_plots.get(key)
+        if images is not None:
+            _information_plots.move_to_end(key)
+            return images
+
+    def render():
+        pngs = []
+        for fig in create_information_plots(mean_latitude=key[0]):
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=dpi)
+            pngs.append(buffer.getvalue())
+        return tuple(pngs)
+
+    images = _information_plot_flights.do(key, render)
+    with _information_plots_lock:
+        _information_plots[key] = images
+        while len(_information_plots) > MAX_CACHED_INFORMATION_PLOTS:
+            _information_plots.popitem(last=False)
+    return images
+
+
+_prerender_thread = None
+
+
+def prerender_information_plots(latitudes=range(-90, 91), dpi=100):
+    """
+    Render the information plots of every slider latitude in a background thread.
+
+    Optional: render_information_plots already renders on demand and caches.
+    Warming all 181 latitudes takes about a minute of CPU that competes with
+    the first requests, so the app only does it when settings.json sets
+    "prerender_information_plots". Only the first call starts a thread; later
+    calls return the same one.
+    """
+    global _prerender_thread
+    with _information_plots_lock:
+        if _prerender_thread is None:
+            def prerender():
+                for latitude in latitudes:
+                    render_information_plots(latitude, dpi=dpi)
+
+            _prerender_thread = threading.Thread(target=prerender, daemon=True)
+            _prerender_thread.start()
+        return _prerender_thread
+
+
 import streamlit as st
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -1,27 +1,242 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
-from scipy.interpolate import griddata
+from scipy.interpolate import CloughTocher2DInterpolator, RectBivariateSpline
+from scipy.spatial import Delaunay, cKDTree
 
 
-def get_interpolated_irradiance_df(irradiance_df: pd.DataFrame, terrain_df: pd.DataFrame) -> pd.DataFrame:
-    points = irradiance_df[['latitude', 'longitude']].values
-    values = irradiance_df['irradiance'].values
+class IrradianceInterpolator:
+    """
+    Cubic interpolator of an irradiance dataset, built once and evaluated many times.
+
+    The Delaunay triangulation and the Clough-Tocher gradients are computed in
+    the constructor, so each call only costs the point location and the
+    polynomial evaluation. Results match griddata(..., method='cubic').
+    Targets outside the convex hull of the source points take the value of
+    the nearest source point, found with a KD-tree built once per dataset.
+
+    Parameters:
+    - points: (N, 2) array of (latitude, longitude) source points
+    - values: (N,) array of irradiance values
+    """
+
+    def __init__(self, points, values):
+        self.points = np.asarray(points, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self._cubic = CloughTocher2DInterpolator(self.points, self.values)
+
+    _tree = None
+
+    @property
+    def tree(self):
+        """KD-tree over the source points, built on the first nearest-neighbour query."""
+        if self._tree is None:
+            self._tree = cKDTree(self.points)
+        return self._tree
+
+    def nearest(self, target_points):
+        """Value of the nearest source point of each target."""
+        _, indices = self.tree.query(target_points)
+        return self.values[indices]
+
+    def _evaluate(self, target_points):
+        return self._cubic(target_points)
+
+    def __call__(self, lats, lons):
+        lats = np.asarray(lats, dtype=float)
+        target_points = np.column_stack([lats.ravel(), np.asarray(lons, dtype=float).ravel()])
+
+        interpolated_values = self._evaluate(target_points)
+
+        nan_mask = np.isnan(interpolated_values)
+        if np.any(nan_mask):
+            print(f"Found {np.sum(nan_mask)} NaN values in interpolated data.")
+            interpolated_values[nan_mask] = self.nearest(target_points[nan_mask])
+            print("Replaced NaN values with nearest neighbor interpolation")
+
+        return interpolated_values.reshape(lats.shape)
+
+
+class LatticeIrradianceInterpolator(IrradianceInterpolator):
+    """
+    Bicubic spline interpolator for datasets sampled on a regular lat/lon lattice.
+
+    Evaluating the spline is constant time per point (no point location in a
+    triangulation), which makes millions of targets cheap. Targets outside the
+    lattice fall back to the nearest source point.
+
+    Parameters:
+    - points, values: As in IrradianceInterpolator
+    - lat_axis, lon_axis, grid: Lattice returned by regular_lattice
+    """
+
+    def __init__(self, points, values, lat_axis, lon_axis, grid):
+        self.points = np.asarray(points, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self.lat_axis = lat_axis
+        self.lon_axis = lon_axis
+        self._spline = RectBivariateSpline(lat_axis, lon_axis, grid, kx=3, ky=3, s=0)
+
+    def _evaluate(self, target_points):
+        lats, lons = target_points[:, 0], target_points[:, 1]
+        interpolated_values = self._spline.ev(lats, lons)
+        outside = ((lats < self.lat_axis[0]) | (lats > self.lat_axis[-1]) |
+                   (lons < self.lon_axis[0]) | (lons > self.lon_axis[-1]))
+        interpolated_values[outside] = np.nan
+        return interpolated_values
+
+
+class IncrementalIrradianceInterpolator(IrradianceInterpolator):
+    """
+    Scattered cubic interpolator that accepts new samples without re-triangulating.
+
+    The triangulation is updated in place with Qhull's incremental mode, so
+    adding a few dozen samples around a site only re-triangulates the
+    affected region. The Clough-Tocher gradients, however, come from a global
+    iterative fit that SciPy does not expose per vertex: every add_points call
+    refits them over all N points, O(N) per call (about 40 ms for the 10,000
+    points of the 0.4° dataset). Add samples in batches rather than one by
+    one. Calls and updates are serialised because they share the
+    triangulation.
+
+    Parameters:
+    - points, values: As in IrradianceInterpolator
+    """
+
+    def __init__(self, points, values):
+        self.points = np.asarray(points, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self._tri = Delaunay(self.points, incremental=True)
+        self._cubic = CloughTocher2DInterpolator(self._tri, self.values)
+        self._lock = threading.RLock()
 
-    target_points = terrain_df[['latitude', 'longitude']].values
+    def add_points(self, points, values, tol=1e-9):
+        """
+        Add samples, skipping those that duplicate an existing point.
 
-    interpolated_values = griddata(points, values, target_points, method='cubic')
+        The triangulation is extended incrementally; gradients are refit over
+        every point (see the class docstring).
 
-    nan_mask = np.isnan(interpolated_values)
-    if np.any(nan_mask):
-        print(f"Found {np.sum(nan_mask)} NaN values in interpolated data.")
-        interpolated_nn = griddata(points, values, target_points, method='nearest')
-        interpolated_values[nan_mask] = interpolated_nn[nan_mask]
-        print("Replaced NaN values with nearest neighbor interpolation")
+        Returns:
+        - Number of samples added
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        values = np.asarray(values, dtype=float).ravel()
+        with self._lock:
+            distances, _ = self.tree.query(points)
+            new = distances > tol
+            # Duplicates inside the batch itself
+            _, first = np.unique(np.round(points / tol) * tol, axis=0, return_index=True)
+            new &= np.isin(np.arange(len(points)), first)
+            if not np.any(new):
+                return 0
+
+            self._tri.add_points(points[new])
+            self.points = self._tri.points
+            self.values = np.concatenate([self.values, values[new]])
+            # Global gradient refit over the updated triangulation
+            self._cubic = CloughTocher2DInterpolator(self._tri, self.values)
+            self._tree = None
+            return int(np.count_nonzero(new))
+
+    def __call__(self, lats, lons):
+        with self._lock:
+            return super().__call__(lats, lons)
+
+
+def regular_lattice(points, values, rtol=1e-4):
+    """
+    Detect a dataset sampled once at every node of a regular lat/lon lattice.
+
+    The default tolerance accepts axes stored as float32 (see irradiance_store).
+
+    Returns:
+    - (lat_axis, lon_axis, grid) with grid[i, j] the value at (lat_axis[i], lon_axis[j]),
+      or None if the points are scattered
+    """
+    lat_axis, lat_index = np.unique(points[:, 0], return_inverse=True)
+    lon_axis, lon_index = np.unique(points[:, 1], return_inverse=True)
+    # A bicubic spline needs at least 4 nodes per axis
+    if lat_axis.size < 4 or lon_axis.size < 4 or lat_axis.size * lon_axis.size != len(points):
+        return None
+
+    for axis in (lat_axis, lon_axis):
+        steps = np.diff(axis)
+        if not np.allclose(steps, steps[0], rtol=rtol, atol=0):
+            return None
+
+    grid = np.full((lat_axis.size, lon_axis.size), np.nan)
+    grid[lat_index, lon_index] = values
+    if np.isnan(grid).any():
+        return None
+    return lat_axis, lon_axis, grid
+
+
+_interpolators = OrderedDict()
+_interpolators_lock = threading.Lock()
+MAX_CACHED_INTERPOLATORS = 8
+
+
+def get_irradiance_interpolator(irradiance_df: pd.DataFrame, use_lattice=True) -> IrradianceInterpolator:
+    """
+    Return the interpolator of a dataset, building it on first use.
+
+    Datasets sampled on a regular lat/lon lattice (like the NASA POWER grids in
+    data/) get the bicubic LatticeIrradianceInterpolator, others the scattered
+    Clough-Tocher IrradianceInterpolator. Interpolators are cached by a hash of
+    the dataset contents, so every DataFrame holding the same data shares one.
+
+    Parameters:
+    - irradiance_df: DataFrame or IrradianceData with latitude, longitude and irradiance columns
+    - use_lattice: Use the lattice fast path when the data allows it
+    """
+    points = np.column_stack([np.asarray(irradiance_df['latitude'], dtype=float),
+                              np.asarray(irradiance_df['longitude'], dtype=float)])
+    values = np.ascontiguousarray(irradiance_df['irradiance'], dtype=float)
+    key = (hashlib.sha1(points.tobytes() + values.tobytes()).hexdigest(), use_lattice)
+
+    with _interpolators_lock:
+        interpolator = _interpolators.get(key)
+        if interpolator is not None:
+            _interpolators.move_to_end(key)
+            return interpolator
+
+    lattice = regular_lattice(points, values) if use_lattice else None
+    if lattice is not None:
+        interpolator = LatticeIrradianceInterpolator(points, values, *lattice)
+    else:
+        interpolator = IrradianceInterpolator(points, values)
+    with _interpolators_lock:
+        _interpolators[key] = interpolator
+        while len(_interpolators) > MAX_CACHED_INTERPOLATORS:
+            _interpolators.popitem(last=False)
+    return interpolator
+
+
+def interpolate_irradiance(irradiance_df: pd.DataFrame, lats, lons) -> np.ndarray:
+    """
+    Interpolate the irradiance dataset at arbitrary coordinates.
+
+    Parameters:
+    - irradiance_df: DataFrame with latitude, longitude and irradiance columns
+    - lats, lons: Arrays of target coordinates (any matching shape)
+
+    Returns:
+    - numpy.ndarray of irradiance values with the same shape as `lats`
+    """
+    return get_irradiance_interpolator(irradiance_df)(lats, lons)
+
+
+def get_interpolated_irradiance_df(irradiance_df: pd.DataFrame, terrain_df: pd.DataFrame) -> pd.DataFrame:
+    interpolated_values = interpolate_irradiance(irradiance_df, terrain_df['latitude'], terrain_df['longitude'])
 
     interpolated_df = pd.DataFrame({
         'latitude': terrain_df['latitude'],
         'longitude': terrain_df['longitude'],
         'irradiance': interpolated_values
     })
-    
-    return interpolated_df
\ No newline at end of file
+
+    return interpolated_df
@@ -1,93 +1,126 @@
 import numpy as np
 import pandas as pd
-import requests
 
-def get_terrain_data(min_lat, max_lat, min_lon, max_lon, resolution=30):
+from .elevation_sources import OpenElevationSource
+from .open_elevation import DEFAULT_BATCH_SIZE, DEFAULT_MAX_WORKERS
+from .slope_aspect_engine import compute_slope_aspect
+from .terrain_grid import TerrainGrid
+
+
+def grid_shape(min_lat, max_lat, min_lon, max_lon, resolution=30):
     """
-    Get terrain slope and aspect data for a coordinate range
-    
-    Parameters:
-    min_lat, max_lat: Latitude bounds
-    min_lon, max_lon: Longitude bounds
-    resolution: Resolution in meters
-    
-    Returns:
-    pandas.DataFrame: DataFrame with latitude, longitude, slope, aspect columns
+    Number of latitude and longitude samples used for a bounding box at a given resolution (m).
     """
-    print(f"Fetching elevation data for: ({min_lat:.4f}, {min_lon:.4f}) to ({max_lat:.4f}, {max_lon:.4f})")
-    
-    # Calculate number of samples based on resolution
     lat_samples = int((max_lat - min_lat) * 111000 / resolution) + 1
     lon_samples = int((max_lon - min_lon) * 111000 / resolution) + 1
     
-    # Ensure reasonable number of samples
-    lat_samples = min(lat_samples, 100)
-    lon_samples = min(lon_samples, 100)
-    
-    # Create latitude and longitude arrays
-    lats = np.linspace(min_lat, max_lat, lat_samples)
-    lons = np.linspace(min_lon, max_lon, lon_samples)
-    
-    # Create coordinate grid
-    lat_grid, lon_grid = np.meshgrid(lats, lons)
-    
-    # Prepare points for API request
-    points = []
-    for i in range(lat_grid.shape[0]):
-        for j in range(lat_grid.shape[1]):
-            points.append({
-                "latitude": lat_grid[i, j],
-                "longitude": lon_grid[i, j]
-            })
-    
-    # API request to get elevation data
-    url = "https://api.open-elevation.com/api/v1/lookup"
-    payload = {"locations": points}
-    
+    # At least two samples per axis are needed to compute gradients
+    return max(lat_samples, 2), max(lon_samples, 2)
+
+
+def get_elevation_source(use_cache=True, max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                         elevation_url=None, elevation_source=None):
+    """
+    Return `elevation_source` or, if it is None, an OpenElevationSource built from the other options.
+    """
+    if elevation_source is not None:
+        return elevation_source
+    return OpenElevationSource(url=elevation_url, batch_size=batch_size, max_workers=max_workers,
+                               cache=None if use_cache else False)
+
+
+def build_terrain_grid(lats, lons, elevation_source) -> TerrainGrid:
+    """
+    Fetch elevations on the grid spanned by two coordinate axes and derive slope and aspect.
+
+    Parameters:
+    lats, lons: 1-D latitude (rows) and longitude (columns) axes
+    elevation_source: ElevationSource to read elevations from
+
+    Returns:
+    TerrainGrid: Grid with elevation, slope and aspect fields. `grid.degraded`
+    flags the points whose elevation is synthetic because the source failed.
+    """
+    grid = TerrainGrid(lats, lons)
+    lat_grid, lon_grid = grid.lat_grid, grid.lon_grid
+
     try:
-        response = requests.post(url, json=payload)
-        data = response.json()
-        
-        # Extract elevations and reshape to grid
-        elevations = np.array([point["elevation"] for point in data["results"]])
-        elevation_grid = elevations.reshape(lat_grid.shape)
-        
-        print(f"Successfully fetched elevation data: {lat_samples}x{lon_samples} grid")
+        elevation_grid = np.array(elevation_source.get_elevations(lat_grid, lon_grid), dtype=float)
     except Exception as e:
         print(f"Error fetching elevation data: {e}")
+        elevation_grid = np.full(grid.shape, np.nan)
+
+    # Points the elevation source could not answer are degraded to synthetic terrain
+    degraded = np.isnan(elevation_grid)
+    n_degraded = int(np.count_nonzero(degraded))
+    if n_degraded == 0:
+        print(f"Successfully fetched elevation data: {grid.shape[0]}x{grid.shape[1]} grid")
+    else:
+        print(f"Fetched {grid.size - n_degraded} real elevation points, {n_degraded} degraded")
         print("Using synthetic data instead...")
         
         # Generate synthetic elevation data as fallback
-        elevation_grid = 500 + 200 * np.random.rand(lat_grid.shape[0], lat_grid.shape[1])
-        elevation_grid += 300 * np.sin(5 * lon_grid) * np.cos(5 * lat_grid)
-    
-    # Calculate slope and aspect
-    # Get approximate cell size in meters
-    cell_size_y = (max_lat - min_lat) / (lat_samples-1) * 111000  # m/cell
-    cell_size_x = (max_lon - min_lon) / (lon_samples-1) * 111000 * np.cos(np.radians(np.mean([min_lat, max_lat])))  # m/cell
-    
-    # Calculate slope (in degrees)
-    dy, dx = np.gradient(elevation_grid, cell_size_y, cell_size_x)
-    slope = np.degrees(np.arctan(np.sqrt(dx**2 + dy**2)))
+        synthetic = 500 + 200 * np.random.rand(*grid.shape)
+        synthetic += 300 * np.sin(5 * lon_grid) * np.cos(5 * lat_grid)
+        elevation_grid[degraded] = synthetic[degraded]
+    
+    # Calculate slope and aspect with per-row cell sizes
+    slope, aspect = compute_slope_aspect(elevation_grid, grid.lats, grid.lons)
+    
+    grid.elevation = elevation_grid
+    grid.slope = slope      # in degrees (0-90)
+    grid.aspect = aspect    # downslope direction in degrees (0-360, clockwise from north)
+    grid.degraded = degraded
+    return grid
+
+
+def grid_axes(min_lat, max_lat, min_lon, max_lon, resolution=30):
+    """
+    Latitude and longitude axes sampled for a bounding box at a given resolution (m).
+    """
+    lat_samples, lon_samples = grid_shape(min_lat, max_lat, min_lon, max_lon, resolution)
+    return np.linspace(min_lat, max_lat, lat_samples), np.linspace(min_lon, max_lon, lon_samples)
+
+
+def get_terrain_grid(min_lat, max_lat, min_lon, max_lon, resolution=30, use_cache=True,
+                     max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, elevation_url=None,
+                     elevation_source=None) -> TerrainGrid:
+    """
+    Get terrain elevation, slope and aspect for a coordinate range
     
-    # Calculate aspect (in degrees)
-    aspect = np.degrees(np.arctan2(dy, dx))
-    aspect = np.mod(aspect + 360, 360)
+    Parameters:
+    min_lat, max_lat: Latitude bounds
+    min_lon, max_lon: Longitude bounds
+    resolution: Resolution in meters
+    use_cache: Read and store elevations in the on-disk tile cache
+    max_workers: Number of concurrent elevation requests
+    batch_size: Maximum number of points per elevation request
+    elevation_url: open-elevation compatible lookup endpoint (default: public API)
+    elevation_source: ElevationSource to read elevations from, e.g. a LocalDEMSource.
+                      Overrides the open-elevation options above.
     
-    # Create DataFrame
-    # Flatten the arrays
-    lat_flat = lat_grid.flatten()
-    lon_flat = lon_grid.flatten()
-    slope_flat = slope.flatten()
-    aspect_flat = aspect.flatten()
+    Returns:
+    TerrainGrid: Grid with elevation, slope and aspect fields
+    """
+    print(f"Fetching elevation data for: ({min_lat:.4f}, {min_lon:.4f}) to ({max_lat:.4f}, {max_lon:.4f})")
     
-    # Create a DataFrame with just the requested columns
-    df = pd.DataFrame({
-        'latitude': lat_flat,
-        'longitude': lon_flat,
-        'slope': slope_flat,        # in degrees (0-90)
-        'aspect': aspect_flat       # in degrees (0-360, clockwise from north)
-    })
+    # Rows follow latitude and columns longitude
+    lats, lons = grid_axes(min_lat, max_lat, min_lon, max_lon, resolution)
+    source = get_elevation_source(use_cache, max_workers, batch_size, elevation_url, elevation_source)
+    return build_terrain_grid(lats, lons, source)
+
+
+def get_terrain_data(min_lat, max_lat, min_lon, max_lon, resolution=30, **kwargs) -> pd.DataFrame:
+    """
+    Get terrain slope and aspect data for a coordinate range as a DataFrame.
+
+    Takes the same parameters as get_terrain_grid.
+
+    Returns:
+    pandas.DataFrame: DataFrame with latitude, longitude, slope, aspect columns
+    """
+    grid = get_terrain_grid(min_lat, max_lat, min_lon, max_lon, resolution=resolution, **kwargs)
+    df = grid.to_dataframe(['slope', 'aspect'])
     
     print(f"Created DataFrame with {len(df)} points")
     return df
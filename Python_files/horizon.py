@@ -0,0 +1,352 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy.interpolate import RegularGridInterpolator
+
+from .get_slope_aspect import get_elevation_source
+from .pv_simulation import _time_terms, solar_position
+from .slope_aspect_engine import METERS_PER_DEGREE, _tiles, cell_sizes
+
+DEFAULT_SECTORS = 16
+DEFAULT_MAX_DISTANCE = 5000  # m
+DEFAULT_TILE_SIZE = 256
+DEFAULT_RING_RESOLUTION = 250  # m
+EARTH_RADIUS = 6371000  # m
+
+
+def ray_distances(cell_size, max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Distances (m) sampled along each horizon ray: one per cell for the first 8 cells, then 10% further each step.
+
+    Nearby terrain decides most of the horizon and is sampled densely; far
+    ridges are wide enough for the sparser steps.
+    """
+    distances = [cell_size * k for k in range(1, 9)]
+    while distances[-1] * 1.1 < max_distance:
+        distances.append(distances[-1] * 1.1)
+    return np.array([d for d in distances if d <= max_distance] or [min(cell_size, max_distance)])
+
+
+def _horizon_block(block, halo_rows, halo_cols, n_rows, n_cols, cell_size_y, cell_size_x, n_sectors, distances):
+    """
+    Horizon angles (degrees) of the n_rows x n_cols cells at the centre of `block`.
+
+    `block` holds the tile plus `halo_rows`/`halo_cols` cells on every side, set to -inf
+    where they fall outside the DEM so that rays leaving the grid see no terrain.
+    The halo is at most the size of the DEM, so samples beyond the block are clamped
+    to its -inf border. cell_size_x has one entry per tile row.
+    """
+    rows = np.arange(n_rows)[:, None] + halo_rows
+    cols = np.arange(n_cols)[None, :] + halo_cols
+    ground = block[halo_rows:halo_rows + n_rows, halo_cols:halo_cols + n_cols]
+    horizon = np.empty((n_rows, n_cols, n_sectors), dtype=np.float32)
+    best = np.empty((n_rows, n_cols))
+
+    for sector in range(n_sectors):
+        # Sector azimuths are clockwise from North; rows grow northwards
+        azimuth = 2 * np.pi * sector / n_sectors
+        best.fill(-np.inf)
+        for distance in distances:
+            row_offset = int(round(distance * np.cos(azimuth) / cell_size_y))
+            col_offset = np.rint(distance * np.sin(azimuth) / cell_size_x).astype(int)[:, None]
+            sample = block[np.clip(rows + row_offset, 0, block.shape[0] - 1),
+                           np.clip(cols + col_offset, 0, block.shape[1] - 1)]
+            # Earth curvature lowers distant terrain by d² / 2R
+            rise = sample - ground - distance ** 2 / (2 * EARTH_RADIUS)
+            np.maximum(best, rise / distance, out=best)
+        horizon[:, :, sector] = np.degrees(np.arctan(best))
+    return horizon
+
+
+def _tile_task(elevation, cell_size_y, cell_size_x, halo_rows, halo_cols, row0, row1, col0, col1, n_sectors,
+               distances):
+    n_rows, n_cols = elevation.shape
+    block = np.full((row1 - row0 + 2 * halo_rows, col1 - col0 + 2 * halo_cols), -np.inf)
+    src_row0, src_row1 = max(row0 - halo_rows, 0), min(row1 + halo_rows, n_rows)
+    src_col0, src_col1 = max(col0 - halo_cols, 0), min(col1 + halo_cols, n_cols)
+    block[src_row0 - row0 + halo_rows:src_row1 - row0 + halo_rows,
+          src_col0 - col0 + halo_cols:src_col1 - col0 + halo_cols] = elevation[src_row0:src_row1, src_col0:src_col1]
+    # Unknown elevations (NaN) are treated as absent terrain
+    block[np.isnan(block)] = -np.inf
+    return (block, halo_rows, halo_cols, row1 - row0, col1 - col0, cell_size_y, cell_size_x[row0:row1], n_sectors,
+            distances)
+
+
+def compute_horizon(elevation, lats, lons, n_sectors=DEFAULT_SECTORS, max_distance=DEFAULT_MAX_DISTANCE,
+                    tile_size=DEFAULT_TILE_SIZE, max_workers=1, out_dir=None, window=None):
+    """
+    Horizon elevation angle of every DEM cell in `n_sectors` azimuth sectors.
+
+    For each sector a ray is marched from every cell of a tile at once: the
+    elevation at each sample distance is gathered for the whole tile, and the
+    steepest rise seen so far is kept. Tiles are processed with a halo as wide
+    as the longest ray, so the result does not depend on the tiling, and can be
+    spread over several processes with a bounded number in flight. Terrain
+    outside the DEM, or with a NaN elevation, is treated as absent: pass a DEM
+    that extends `max_distance` beyond the cells of interest and select them
+    with `window` (see padded_horizon).
+
+    Parameters:
+    - elevation: 2-D elevation array (m), rows along `lats` and columns along `lons`
+    - lats, lons: 1-D regularly spaced coordinate axes
+    - n_sectors: Number of azimuth sectors, sector k is centred on 360 * k / n_sectors degrees from North
+    - max_distance: Length of the rays (m)
+    - tile_size: Side of a tile in cells
+    - max_workers: Number of worker processes (1 computes in-process, None uses every core)
+    - out_dir: If given, the result is written to a memory-mapped horizon.npy there
+    - window: (row0, row1, col0, col1) of the cells to compute (default: every cell); the rest of the
+      DEM only serves as surrounding terrain
+
+    Returns:
+    - float32 array of shape (rows, cols, n_sectors) of the window, with horizon angles in degrees
+      (negative when the terrain drops away in every sampled direction)
+    """
+    window_row0, window_row1, window_col0, window_col1 = window or (0, elevation.shape[0], 0, elevation.shape[1])
+    shape = elevation.shape
+    cell_size_y, cell_size_x = cell_sizes(lats, lons)
+    distances = ray_distances(min(cell_size_y, cell_size_x.min()), max_distance)
+    halo_rows = min(int(np.ceil(distances[-1] / cell_size_y)), shape[0])
+    halo_cols = min(int(np.ceil(distances[-1] / cell_size_x.min())), shape[1])
+
+    out_shape = (window_row1 - window_row0, window_col1 - window_col0, n_sectors)
+    if out_dir is not None:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        horizon = open_memmap(out_dir / 'horizon.npy', mode='w+', dtype=np.float32, shape=out_shape)
+    else:
+        horizon = np.empty(out_shape, dtype=np.float32)
+    # Tiles are in DEM coordinates, results are written relative to the window
+    offset = (window_row0, window_col0)
+
+    def task(row0, row1, col0, col1):
+        return _tile_task(elevation, cell_size_y, cell_size_x, halo_rows, halo_cols, row0, row1, col0, col1,
+                          n_sectors, distances)
+
+    tiles = [(row0 + window_row0, row1 + window_row0, col0 + window_col0, col1 + window_col0)
+             for row0, row1, col0, col1 in _tiles(out_shape[:2], tile_size)]
+    if max_workers == 1 or len(tiles) == 1:
+        for row0, row1, col0, col1 in tiles:
+            _store(horizon, offset, (row0, row1, col0, col1), _horizon_block(*task(row0, row1, col0, col1)))
+    else:
+        max_workers = max_workers or os.cpu_count()
+        max_in_flight = 2 * max_workers
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            for tile in tiles:
+                pending[tile] = executor.submit(_horizon_block, *task(*tile))
+                if len(pending) >= max_in_flight:
+                    _collect(pending, horizon, offset, keep=max_in_flight // 2)
+            _collect(pending, horizon, offset, keep=0)
+
+    if out_dir is not None:
+        horizon.flush()
+    return horizon
+
+
+def _store(horizon, offset, tile, result):
+    row0, row1, col0, col1 = tile
+    horizon[row0 - offset[0]:row1 - offset[0], col0 - offset[1]:col1 - offset[1]] = result
+
+
+def _collect(pending, horizon, offset, keep):
+    # Write finished tiles in submission order until only `keep` remain in flight
+    while len(pending) > keep:
+        tile, future = next(iter(pending.items()))
+        _store(horizon, offset, tile, future.result())
+        del pending[tile]
+
+
+def padded_horizon(grid, elevation_source=None, n_sectors=DEFAULT_SECTORS, max_distance=DEFAULT_MAX_DISTANCE,
+                   ring_resolution=DEFAULT_RING_RESOLUTION, **kwargs):
+    """
+    Horizon of every point of a TerrainGrid, seeing the terrain up to `max_distance` around it.
+
+    The grid's axes are extended by enough rows and columns, at the same
+    spacing, to cover `max_distance` beyond its edges, so ridges outside the
+    queried box shade the points inside it. The elevations of that ring are
+    read from `elevation_source` on a coarser `ring_resolution` lattice only
+    and interpolated bilinearly: along the rays the terrain beyond the first
+    few cells is sampled sparsely anyway (see ray_distances), and a 5 km ring
+    at the grid's own 30 m spacing would take hundreds of thousands of
+    elevation requests. Ridges narrower than `ring_resolution` outside the box
+    are smoothed. The grid's own elevations are kept for the points it
+    covers. Extra keyword arguments are forwarded to compute_horizon.
+
+    Parameters:
+    - grid: TerrainGrid with elevations and at least two rows and columns
+    - elevation_source: ElevationSource of the surrounding terrain (default: as in get_terrain_grid)
+    - ring_resolution: Spacing (m) of the elevations read around the grid
+
+    Returns:
+    - (rows, cols, n_sectors) horizon angles in degrees
+    """
+    source = get_elevation_source(elevation_source=elevation_source)
+    lat_step = grid.lats[1] - grid.lats[0]
+    lon_step = grid.lons[1] - grid.lons[0]
+    pad_rows = int(np.ceil(max_distance / (abs(lat_step) * METERS_PER_DEGREE)))
+    # Meridians converge, so the ring is widest in columns at the highest latitude
+    cos_lat = np.cos(np.radians(min(np.abs(grid.lats).max() + pad_rows * abs(lat_step), 89.0)))
+    pad_cols = int(np.ceil(max_distance / (abs(lon_step) * METERS_PER_DEGREE * cos_lat)))
+    lats = np.concatenate([grid.lats[0] + lat_step * np.arange(-pad_rows, 0), grid.lats,
+                           grid.lats[-1] + lat_step * np.arange(1, pad_rows + 1)])
+    lons = np.concatenate([grid.lons[0] + lon_step * np.arange(-pad_cols, 0), grid.lons,
+                           grid.lons[-1] + lon_step * np.arange(1, pad_cols + 1)])
+
+    # Coarse lattice over the same extent, never finer than the grid
+    ring_lats = np.linspace(lats[0], lats[-1], max(int(np.ceil(
+        abs(lats[-1] - lats[0]) * METERS_PER_DEGREE / ring_resolution)) + 1, 2))
+    ring_lons = np.linspace(lons[0], lons[-1], max(int(np.ceil(
+        abs(lons[-1] - lons[0]) * METERS_PER_DEGREE * cos_lat / ring_resolution)) + 1, 2))
+    if ring_lats.size >= lats.size or ring_lons.size >= lons.size:
+        ring_lats, ring_lons = lats, lons
+    ring_lat_grid, ring_lon_grid = np.meshgrid(ring_lats, ring_lons, indexing='ij')
+    try:
+        ring = np.array(source.get_elevations(ring_lat_grid, ring_lon_grid), dtype=float)
+    except Exception as e:
+        print(f"Error fetching the terrain around the grid: {e}; shading from the grid only")
+        ring = np.full(ring_lat_grid.shape, np.nan)
+
+    if ring_lats is lats:
+        elevation = ring
+    else:
+        # Unknown ring elevations stay NaN, i.e. absent terrain
+        interpolator = RegularGridInterpolator((ring_lats, ring_lons), ring, bounds_error=False, fill_value=None)
+        lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+        elevation = interpolator((lat_grid, lon_grid))
+    window = (pad_rows, pad_rows + grid.lats.size, pad_cols, pad_cols + grid.lons.size)
+    elevation[window[0]:window[1], window[2]:window[3]] = grid.elevation
+    return compute_horizon(elevation, lats, lons, n_sectors=n_sectors, max_distance=max_distance, window=window,
+                           **kwargs)
+
+
+def sky_view_factor(horizon):
+    """Fraction of the isotropic sky visible from each cell, mean of cos²(horizon) over the sectors."""
+    return np.mean(np.cos(np.radians(np.clip(horizon, 0, 90))) ** 2, axis=-1)
+
+
+def sun_sector_weights(latitude, n_sectors=DEFAULT_SECTORS):
+    """
+    Yearly extraterrestrial horizontal irradiance per sun azimuth sector, as a function of the sun elevation.
+
+    Parameters:
+    - latitude: Latitude of the sun path (degrees)
+    - n_sectors: Number of azimuth sectors
+
+    Returns:
+    - list with, for each sector, (sorted sun elevations in degrees, weight of the sun at or above each of them)
+    - total weight of the year
+    """
+    _, _, extraterrestrial, _ = _time_terms()
+    east, north, up = (component[0] for component in solar_position([latitude], [0.0]))
+    day = up > 0
+    weight = extraterrestrial[day] * up[day]
+    elevation = np.degrees(np.arcsin(up[day]))
+    sector = np.rint(np.mod(np.arctan2(east[day], north[day]), 2 * np.pi) / (2 * np.pi / n_sectors)).astype(int)
+    sector %= n_sectors
+
+    tables = []
+    for k in range(n_sectors):
+        order = np.argsort(elevation[sector == k])
+        sector_elevation = elevation[sector == k][order]
+        above = np.cumsum(weight[sector == k][order][::-1])[::-1]
+        tables.append((sector_elevation, above))
+    return tables, weight.sum()
+
+
+def beam_fraction(horizon, latitude):
+    """
+    Fraction of the yearly direct sunlight (weighted by the horizontal extraterrestrial irradiance) that is
+    not blocked by the horizon.
+
+    Parameters:
+    - horizon: Array (..., n_sectors) of horizon angles in degrees
+    - latitude: Latitude of the sun path (degrees), one for the whole array
+    """
+    tables, total = sun_sector_weights(latitude, horizon.shape[-1])
+    unblocked = np.zeros(horizon.shape[:-1])
+    for k, (sector_elevation, above) in enumerate(tables):
+        if sector_elevation.size == 0:
+            continue
+        first_visible = np.searchsorted(sector_elevation, horizon[..., k], side='right')
+        unblocked += np.append(above, 0.0)[first_visible]
+    return unblocked / total
+
+
+def shading_factor(horizon, lats, diffuse_fraction=0.3):
+    """
+    Share of the unshaded yearly irradiance that reaches each cell.
+
+    Direct light is blocked when the sun is below the horizon of its azimuth
+    sector, summed over the sun path of the year; diffuse light is scaled by
+    the sky view factor:
+        shading = (1 - diffuse_fraction) * beam_fraction + diffuse_fraction * sky_view_factor
+    Sun paths are computed once per whole degree of latitude.
+
+    Parameters:
+    - horizon: Array (rows, cols, n_sectors) of horizon angles in degrees
+    - lats: 1-D latitude of each row
+    - diffuse_fraction: Share of diffuse light in the yearly global irradiance
+
+    Returns:
+    - 2-D array of factors between 0 and 1
+    """
+    lats = np.asarray(lats, dtype=float)
+    beam = np.empty(horizon.shape[:2])
+    bands = np.rint(lats)
+    for band in np.unique(bands):
+        rows = bands == band
+        beam[rows] = beam_fraction(horizon[rows], band)
+    return (1 - diffuse_fraction) * beam + diffuse_fraction * sky_view_factor(horizon)
+
+
+def terrain_shading(grid, elevation_source=None, n_sectors=DEFAULT_SECTORS, max_distance=DEFAULT_MAX_DISTANCE,
+                    diffuse_fraction=0.3, **kwargs):
+    """
+    Horizon angles and shading factor of a TerrainGrid with elevations.
+
+    The horizon includes the terrain up to `max_distance` around the grid (see
+    padded_horizon). Extra keyword arguments are forwarded to compute_horizon.
+
+    Returns:
+    - horizon: (rows, cols, n_sectors) angles in degrees
+    - shading: (rows, cols) factors
+    """
+    horizon = padded_horizon(grid, elevation_source, n_sectors=n_sectors, max_distance=max_distance, **kwargs)
+    return horizon, shading_factor(horizon, grid.lats, diffuse_fraction)
+
+
+if __name__ == '__main__':
+    import time
+
+    # Valley running East-West, 100 m cells
+    for size in (100, 1000):
+        lats = -25.5 + np.arange(size) / 1110
+        lons = -70.5 + np.arange(size) / 1110
+        elevation = 600 + 400 * np.cos(2 * np.pi * np.arange(size) / 100)[:, None] * np.ones(size)
+
+        for max_workers in (1, None):
+            start = time.perf_counter()
+            horizon = compute_horizon(elevation, lats, lons, max_workers=max_workers, tile_size=128)
+            duration = time.perf_counter() - start
+            shading = shading_factor(horizon, lats)
+            print(f"{size}x{size} grid with max_workers={max_workers}: {duration:.2f} s, "
+                  f"shading {shading.min():.2f}-{shading.max():.2f}")
+
+    from .elevation_sources import ElevationSource
+    from .terrain_grid import TerrainGrid
+
+    class RidgesSource(ElevationSource):
+        # Flat valley floor between ridges 1 km north and south of its centre
+        def get_elevations(self, lats, lons):
+            return np.where(np.abs(np.asarray(lats) + 25.5) > 0.009, 800.0, 0.0)
+
+    lats = -25.5 + np.arange(-5, 6) / 1110
+    lons = -70.5 + np.arange(-5, 6) / 1110
+    grid = TerrainGrid(lats, lons, elevation=np.zeros((lats.size, lons.size)))
+    inside = shading_factor(compute_horizon(grid.elevation, lats, lons), lats)
+    _, padded = terrain_shading(grid, elevation_source=RidgesSource())
+    print(f"Valley floor shading: {inside.mean():.2f} from the query box only, "
+          f"{padded.mean():.2f} with the surrounding ridges")
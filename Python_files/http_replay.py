@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from .http_session import override_session
+
+
+def request_key(method, url, body=None):
+    """
+    Host-independent key of an HTTP request: method, path, sorted query and body hash.
+
+    Ignoring the host lets traffic recorded against the real APIs be replayed by
+    the local stand-in server and vice versa.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    if isinstance(body, str):
+        body = body.encode()
+    body_hash = hashlib.sha1(body or b'').hexdigest()
+    return f"{method.upper()} {parts.path.rstrip('/')}?{query} {body_hash}"
+
+
+class Cassette:
+    """
+    Recorded HTTP interactions stored as JSON lines.
+
+    Each line holds the request key, the response status, content type and
+    body. Later recordings of the same key replace earlier ones on load.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.interactions = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.interactions[entry['key']] = entry
+
+    def __contains__(self, key):
+        return key in self.interactions
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def get(self, key):
+        return self.interactions.get(key)
+
+    def record(self, key, status, content_type, body):
+        entry = {
+            'key': key,
+            'status': status,
+            'content_type': content_type,
+            'body': base64.b64encode(body).decode('ascii'),
+        }
+        with self._lock:
+            self.interactions[key] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    @staticmethod
+    def body_of(entry):
+        return base64.b64decode(entry['body'])
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class ReplaySession(requests.Session):
+    """
+    requests.Session that records responses to, or serves them from, a Cassette.
+
+    Modes:
+    - 'record': Send every request and store the response
+    - 'replay': Serve responses from the cassette only, never touching the network
+    - 'auto': Replay recorded requests and record the others
+    """
+
+    def __init__(self, cassette, mode='auto'):
+        super().__init__()
+        if mode not in ('record', 'replay', 'auto'):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+        self.mode = mode
+        self.replayed = 0
+        self.recorded = 0
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+
+        if self.mode != 'record':
+            entry = self.cassette.get(key)
+            if entry is not None:
+                self.replayed += 1
+                return self._build_response(request, entry)
+            if self.mode == 'replay':
+                raise ReplayMissError(f"No recorded response for {key}")
+
+        response = super().send(request, **kwargs)
+        if response.status_code < 500:
+            self.cassette.record(key, response.status_code, response.headers.get('Content-Type'), response.content)
+            self.recorded += 1
+        return response
+
+    @staticmethod
+    def _build_response(request, entry):
+        response = requests.Response()
+        response.status_code = entry['status']
+        response._content = Cassette.body_of(entry)
+        if entry.get('content_type'):
+            response.headers['Content-Type'] = entry['content_type']
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+
+@contextmanager
+def replaying(cassette_path, mode='auto'):
+    """
+    Route the open-elevation and NASA POWER clients through a ReplaySession.
+
+    Example:
+        with replaying('data/cassettes/santiago.jsonl', mode='replay'):
+            get_energy_production_grid(...)
+    """
+    session = ReplaySession(cassette_path, mode=mode)
+    with override_session(session):
+        yield session
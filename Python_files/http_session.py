@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_override = None
+
+
+def get_session(pool_size=8):
+    """
+    Return the requests.Session shared by the HTTP clients.
+
+    Sessions are pooled so `pool_size` concurrent requests reuse keep-alive
+    connections. Inside `override_session` every client gets the overriding
+    session instead (e.g. a recording or replaying session).
+    """
+    if _override is not None:
+        return _override
+    with _sessions_lock:
+        session = _sessions.get(pool_size)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[pool_size] = session
+        return session
+
+
+@contextmanager
+def override_session(session):
+    """Route every request made through get_session to `session` while the block runs."""
+    global _override
+    previous = _override
+    _override = session
+    try:
+        yield session
+    finally:
+        _override = previous
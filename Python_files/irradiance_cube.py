@@ -0,0 +1,251 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .irradiance_store import DATA_DIR
+
+DEFAULT_CUBE_DIR = DATA_DIR / 'irradiance_cube'
+MONTHS = tuple(range(1, 13))
+
+
+class IrradianceCube:
+    """
+    Monthly irradiance (kWh/m²/day) on a lat/lon lattice, stored as chunks on disk.
+
+    The cube has shape (lat, lon, year, month). It is split along latitude and
+    longitude into chunks of `chunk_size` x `chunk_size` nodes, each one a
+    float32 .npy file opened memory-mapped, so a query only pages in the
+    chunks that intersect its region. Missing months are NaN.
+
+    Layout of `cube_dir`:
+    - index.json: {"lats": [...], "lons": [...], "years": [...], "chunk_size": n}
+    - chunk_{i}_{j}.npy: nodes [i*n:(i+1)*n, j*n:(j+1)*n] of the cube
+
+    Parameters:
+    - cube_dir: Directory written by write_irradiance_cube
+    - max_open_chunks: Number of memory maps kept open at the same time
+    """
+
+    def __init__(self, cube_dir=DEFAULT_CUBE_DIR, max_open_chunks=64):
+        self.cube_dir = Path(cube_dir)
+        index_path = self.cube_dir / 'index.json'
+        if not index_path.exists():
+            raise FileNotFoundError(f"No irradiance cube in {self.cube_dir}. The monthly cube is not part of the "
+                                    f"repository, build it once with `python -m Python_files.irradiance_cube` "
+                                    f"(see 'Monthly Irradiance Data' in the README)")
+        with open(index_path) as f:
+            index = json.load(f)
+        self.lats = np.asarray(index['lats'], dtype=float)
+        self.lons = np.asarray(index['lons'], dtype=float)
+        self.years = [int(year) for year in index['years']]
+        self.chunk_size = int(index['chunk_size'])
+        self.max_open_chunks = max_open_chunks
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.lats.size, self.lons.size, len(self.years), len(MONTHS)
+
+    def _chunk(self, i, j):
+        with self._lock:
+            chunk = self._open.get((i, j))
+            if chunk is None:
+                chunk = np.load(self.cube_dir / f"chunk_{i}_{j}.npy", mmap_mode='r')
+                self._open[(i, j)] = chunk
+                while len(self._open) > self.max_open_chunks:
+                    self._open.popitem(last=False)
+            else:
+                self._open.move_to_end((i, j))
+            return chunk
+
+    def _select(self, years, months):
+        year_index = (slice(None) if years is None else
+                      np.array([self.years.index(year) for year in np.atleast_1d(years)]))
+        month_index = slice(None) if months is None else np.atleast_1d(months) - 1
+        return year_index, month_index
+
+    def read(self, rows, cols, years=None, months=None):
+        """
+        Read a window of the cube.
+
+        Parameters:
+        - rows, cols: Slices of lattice nodes along latitude and longitude
+        - years: Year or list of years to read (default: all)
+        - months: Month or list of months (1-12) to read (default: all)
+
+        Returns:
+        - float32 array of shape (rows, cols, years, months)
+        """
+        row0, row1, _ = rows.indices(self.lats.size)
+        col0, col1, _ = cols.indices(self.lons.size)
+        year_index, month_index = self._select(years, months)
+        n_years = len(self.years) if years is None else np.atleast_1d(years).size
+        n_months = len(MONTHS) if months is None else np.atleast_1d(months).size
+
+        out = np.empty((max(row1 - row0, 0), max(col1 - col0, 0), n_years, n_months), dtype=np.float32)
+        if out.size == 0:
+            return out
+        n = self.chunk_size
+        for i in range(row0 // n, (row1 - 1) // n + 1):
+            for j in range(col0 // n, (col1 - 1) // n + 1):
+                r0, r1 = max(row0, i * n), min(row1, (i + 1) * n)
+                c0, c1 = max(col0, j * n), min(col1, (j + 1) * n)
+                window = self._chunk(i, j)[r0 - i * n:r1 - i * n, c0 - j * n:c1 - j * n]
+                out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = window[:, :, year_index][:, :, :, month_index]
+        return out
+
+    def region(self, min_lat, max_lat, min_lon, max_lon, years=None, months=None):
+        """
+        Read the lattice nodes inside a bounding box.
+
+        Returns:
+        - (lats, lons, values) with values of shape (len(lats), len(lons), years, months)
+        """
+        rows, cols = self._window(min_lat, max_lat, min_lon, max_lon, margin=0)
+        return self.lats[rows], self.lons[cols], self.read(rows, cols, years, months)
+
+    def _window(self, min_lat, max_lat, min_lon, max_lon, margin):
+        def axis_slice(axis, low, high):
+            start = np.searchsorted(axis, low, side='left') - margin
+            stop = np.searchsorted(axis, high, side='right') + margin
+            return slice(int(max(start, 0)), int(min(stop, axis.size)))
+
+        return axis_slice(self.lats, min_lat, max_lat), axis_slice(self.lons, min_lon, max_lon)
+
+    def interpolate(self, lats, lons, year=None, months=None):
+        """
+        Bilinearly interpolate monthly irradiance at arbitrary coordinates.
+
+        Only the lattice window around the targets is read, so memory depends on
+        the size of the queried region rather than on the size of the cube.
+        Targets outside the lattice take the value at its edge.
+
+        Parameters:
+        - lats, lons: Arrays of target coordinates (any matching shape)
+        - year: Year to read (default: mean of every year in the cube)
+        - months: Month or list of months (1-12) to read (default: all)
+
+        Returns:
+        - numpy.ndarray of shape lats.shape + (months,)
+        """
+        lats = np.asarray(lats, dtype=float)
+        shape = lats.shape
+        lats = lats.ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        months = MONTHS if months is None else np.atleast_1d(months)
+
+        rows, cols = self._window(lats.min(), lats.max(), lons.min(), lons.max(), margin=1)
+        window = self.read(rows, cols, years=year, months=months).astype(float)
+        with np.errstate(invalid='ignore'):
+            # Mean over the selected years, ignoring missing months
+            window = np.nanmean(window, axis=2) if window.shape[2] > 1 else window[:, :, 0]
+
+        lat_axis, lon_axis = self.lats[rows], self.lons[cols]
+        r0, fr = _cell_position(lat_axis, lats)
+        c0, fc = _cell_position(lon_axis, lons)
+        r1 = np.minimum(r0 + 1, lat_axis.size - 1)
+        c1 = np.minimum(c0 + 1, lon_axis.size - 1)
+        fr, fc = fr[:, None], fc[:, None]
+
+        top = window[r0, c0] * (1 - fc) + window[r0, c1] * fc
+        bottom = window[r1, c0] * (1 - fc) + window[r1, c1] * fc
+        return (top * (1 - fr) + bottom * fr).reshape(shape + (len(months),))
+
+
+def _cell_position(axis, values):
+    """Index of the lattice cell containing each value and the fractional offset inside it."""
+    if axis.size == 1:
+        return np.zeros(values.size, dtype=int), np.zeros(values.size)
+    index = np.clip(np.searchsorted(axis, values, side='right') - 1, 0, axis.size - 2)
+    fraction = np.clip((values - axis[index]) / (axis[index + 1] - axis[index]), 0, 1)
+    return index, fraction
+
+
+def write_irradiance_cube(cube_dir, lats, lons, years, fetch, chunk_size=16):
+    """
+    Build an irradiance cube chunk by chunk from a per-location monthly series.
+
+    Only one chunk is held in memory at a time. Chunks already on disk are kept,
+    so an interrupted build resumes where it stopped.
+
+    Parameters:
+    - cube_dir: Output directory
+    - lats, lons: Ascending 1-D lattice axes
+    - years: Years stored in the cube
+    - fetch: Callable (lat, lon) -> dict mapping (year, month) to irradiance,
+      e.g. functools.partial(nasa_power.fetch_monthly_irradiance, start_year=..., end_year=...)
+    - chunk_size: Number of lattice nodes per chunk side
+
+    Returns:
+    - IrradianceCube opened on the written directory
+    """
+    cube_dir = Path(cube_dir)
+    cube_dir.mkdir(parents=True, exist_ok=True)
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    years = [int(year) for year in years]
+    year_index = {year: k for k, year in enumerate(years)}
+
+    for i in range(0, lats.size, chunk_size):
+        for j in range(0, lons.size, chunk_size):
+            path = cube_dir / f"chunk_{i // chunk_size}_{j // chunk_size}.npy"
+            if path.exists():
+                continue
+            chunk_lats, chunk_lons = lats[i:i + chunk_size], lons[j:j + chunk_size]
+            chunk = np.full((chunk_lats.size, chunk_lons.size, len(years), len(MONTHS)), np.nan, dtype=np.float32)
+            for r, lat in enumerate(chunk_lats):
+                for c, lon in enumerate(chunk_lons):
+                    for (year, month), value in fetch(float(lat), float(lon)).items():
+                        if year in year_index and 1 <= month <= 12:
+                            chunk[r, c, year_index[year], month - 1] = value
+
+            tmp_path = path.with_name(path.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, chunk)
+            tmp_path.replace(path)
+            print(f"Wrote {path.name}")
+
+    with open(cube_dir / 'index.json', 'w') as f:
+        json.dump({'lats': lats.tolist(), 'lons': lons.tolist(), 'years': years, 'chunk_size': chunk_size}, f)
+    return IrradianceCube(cube_dir)
+
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+
+def load_irradiance_cube(cube_dir=DEFAULT_CUBE_DIR) -> IrradianceCube:
+    """Open an irradiance cube once per process (raises FileNotFoundError if it was never built)."""
+    key = str(Path(cube_dir).resolve())
+    with _cubes_lock:
+        cube = _cubes.get(key)
+        if cube is None:
+            cube = IrradianceCube(cube_dir)
+            _cubes[key] = cube
+        return cube
+
+
+if __name__ == '__main__':
+    import argparse
+    from functools import partial
+
+    from .nasa_power import fetch_monthly_irradiance
+
+    parser = argparse.ArgumentParser(description="Build the monthly irradiance cube from NASA POWER")
+    parser.add_argument('--start-year', type=int, default=2023)
+    parser.add_argument('--end-year', type=int, default=2023)
+    parser.add_argument('--resolution', type=float, default=2.0, help="Lattice step in degrees")
+    parser.add_argument('--url', default=None, help="Monthly point endpoint (e.g. a StubServer power_url)")
+    parser.add_argument('--out', default=str(DEFAULT_CUBE_DIR))
+    args = parser.parse_args()
+
+    # Same coverage as data/irradiance_data_full_res2.csv
+    lats = np.arange(-60, 20 + args.resolution / 2, args.resolution)
+    lons = np.arange(-90, -30 + args.resolution / 2, args.resolution)
+    fetch = partial(fetch_monthly_irradiance, start_year=args.start_year, end_year=args.end_year, url=args.url)
+    cube = write_irradiance_cube(args.out, lats, lons, range(args.start_year, args.end_year + 1), fetch)
+    print(f"Irradiance cube of shape {cube.shape} written to {args.out}")
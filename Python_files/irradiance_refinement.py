@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .get_irradiation import IncrementalIrradianceInterpolator
+from .irradiance_store import DATA_DIR, DATASET_YEARS, load_irradiance
+from .power_harvester import HarvestCheckpoint, harvest_power_grid
+
+DEFAULT_REFINEMENT_STORE = DATA_DIR / 'irradiance_refinement.jsonl'
+# Neighbourhoods whose refinement job is remembered, oldest finished jobs are forgotten first
+MAX_SCHEDULED_REFINEMENTS = 256
+
+
+class IrradianceRefiner:
+    """
+    Irradiance interpolation that gets finer around the sites users query.
+
+    Starts from the coarse irradiance dataset. `refine(lat, lon)` fetches
+    NASA POWER samples on a `step` degree lattice within `radius` degrees of
+    the site, stores them in a persistent JSONL store (shared with the
+    harvester's checkpoint format) and inserts them into the interpolator
+    incrementally. Lattice nodes are aligned on multiples of `step`, so
+    neighbouring sites share samples and each one is fetched only once.
+    Samples stored by previous runs are loaded at start-up.
+
+    NASA POWER's solar parameters come from a 1° grid, so steps below 1° add
+    requests but no information.
+
+    Refined samples are blended with the base dataset, so they must average
+    the same years: a stored sample is used only when it has every year of
+    `start_year`-`end_year`, and with the default base these must be the
+    years of the bundled datasets (DATASET_YEARS).
+
+    Parameters:
+    - base: IrradianceData or DataFrame of the coarse dataset (default: load_irradiance())
+    - store: Path of the refinement store
+    - radius: Half side (degrees) of the refined neighbourhood
+    - step: Spacing (degrees) of the refined samples
+    - start_year, end_year: Years averaged into the base dataset and into each sample
+    - harvest_kwargs: Options of harvest_power_grid (url, concurrency, rate, ...)
+    """
+
+    def __init__(self, base=None, store=DEFAULT_REFINEMENT_STORE, radius=2.0, step=1.0,
+                 start_year=DATASET_YEARS[0], end_year=DATASET_YEARS[1], **harvest_kwargs):
+        if base is None:
+            if (start_year, end_year) != DATASET_YEARS:
+                raise ValueError(f"The default irradiance dataset averages {DATASET_YEARS[0]}-{DATASET_YEARS[1]}, "
+                                 f"refined samples of {start_year}-{end_year} cannot be blended with it")
+            base = load_irradiance()
+        self.radius = radius
+        self.step = step
+        self.start_year = start_year
+        self.end_year = end_year
+        self.harvest_kwargs = harvest_kwargs
+        self.checkpoint = HarvestCheckpoint(store)
+        self.interpolator = IncrementalIrradianceInterpolator(
+            np.column_stack([np.asarray(base['latitude'], dtype=float), np.asarray(base['longitude'], dtype=float)]),
+            np.asarray(base['irradiance'], dtype=float))
+        self._refine_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._scheduled = OrderedDict()
+        self._schedule_lock = threading.Lock()
+
+        stored = [self._sample(entry['lat'], entry['lon']) for entry in self.checkpoint.cells.values()]
+        self._add([sample for sample in stored if sample is not None])
+
+    def _sample(self, lat, lon):
+        series = {(year, month): value for (year, month), value in self.checkpoint.series(lat, lon).items()
+                  if self.start_year <= year <= self.end_year}
+        # Samples missing some of the base dataset's years would bias the blend towards the others
+        if {year for year, _ in series} != set(range(self.start_year, self.end_year + 1)):
+            return None
+        return lat, lon, float(np.mean(list(series.values())))
+
+    def _add(self, samples):
+        if not samples:
+            return 0
+        samples = np.asarray(samples, dtype=float)
+        return self.interpolator.add_points(samples[:, :2], samples[:, 2])
+
+    def neighbourhood(self, lat, lon):
+        """Lattice axes of the samples around a site."""
+        def axis(center, low, high):
+            start = np.ceil((max(center - self.radius, low)) / self.step) * self.step
+            stop = np.floor((min(center + self.radius, high)) / self.step) * self.step
+            return np.round(np.arange(start, stop + self.step / 2, self.step), 6)
+
+        return axis(lat, -90, 90), axis(lon, -180, 180)
+
+    def refine(self, lat, lon):
+        """
+        Fetch and merge the samples around a site (blocking).
+
+        Returns:
+        - Number of samples added to the interpolator
+        """
+        lats, lons = self.neighbourhood(lat, lon)
+        with self._refine_lock:
+            asyncio.run(harvest_power_grid(lats, lons, self.start_year, self.end_year, checkpoint=self.checkpoint,
+                                           **self.harvest_kwargs))
+            samples = [self._sample(float(a), float(b)) for a in lats for b in lons]
+            added = self._add([sample for sample in samples if sample is not None])
+        print(f"Refined irradiance around ({lat:.4f}, {lon:.4f}) with {added} new samples")
+        return added
+
+    def schedule(self, lat, lon):
+        """
+        Refine around a site in the background; repeated requests for the same neighbourhood share one job.
+
+        Returns:
+        - concurrent.futures.Future of refine(lat, lon)
+        """
+        key = (round(lat / self.step), round(lon / self.step))
+        with self._schedule_lock:
+            future = self._scheduled.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._executor.submit(self.refine, lat, lon)
+                self._scheduled[key] = future
+            self._scheduled.move_to_end(key)
+
+            # Forget the oldest finished jobs; a forgotten neighbourhood is refined again from the
+            # store, where its samples are already fresh, so only pending jobs must be kept
+            excess = len(self._scheduled) - MAX_SCHEDULED_REFINEMENTS
+            for old_key in [old_key for old_key, old_future in self._scheduled.items() if old_future.done()][:excess]:
+                del self._scheduled[old_key]
+            return future
+
+    def __call__(self, lats, lons):
+        """Interpolate irradiance with every sample merged so far."""
+        return self.interpolator(lats, lons)
+
+
+_default_refiner = None
+_default_refiner_lock = threading.Lock()
+
+
+def get_default_refiner() -> IrradianceRefiner:
+    """Process-wide refiner over the default dataset and store."""
+    global _default_refiner
+    with _default_refiner_lock:
+        if _default_refiner is None:
+            _default_refiner = IrradianceRefiner()
+        return _default_refiner
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    from .stub_servers import StubServer
+
+    with StubServer() as server, tempfile.TemporaryDirectory() as tmp_dir:
+        refiner = IrradianceRefiner(store=f"{tmp_dir}/refinement.jsonl", url=server.power_url)
+        site = (-25.5, -70.5)
+        print(f"Before: {refiner(*site):.3f} kWh/m²/day")
+        refiner.refine(*site)
+        print(f"After: {refiner(*site):.3f} kWh/m²/day")
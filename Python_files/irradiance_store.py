@@ -0,0 +1,151 @@
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+DEFAULT_DATASET = 'irradiance_data_full_res2'
+# NASA POWER years averaged into the bundled datasets (see Python_notebooks/nasa-power-api.ipynb)
+DATASET_YEARS = (2014, 2023)
+COLUMNS = ('latitude', 'longitude', 'irradiance')
+
+
+class IrradianceData:
+    """
+    Read-only irradiance dataset backed by a (3, N) float32 array.
+
+    The array is normally a memory map of a .npy file, so every process that
+    opens the same dataset shares the same pages. Columns are exposed as
+    contiguous views, by attribute or by name like a DataFrame
+    (data['latitude']).
+    """
+
+    def __init__(self, array):
+        self._array = array
+
+    @property
+    def latitude(self):
+        return self._array[0]
+
+    @property
+    def longitude(self):
+        return self._array[1]
+
+    @property
+    def irradiance(self):
+        return self._array[2]
+
+    def __getitem__(self, column):
+        if column not in COLUMNS:
+            raise KeyError(column)
+        return self._array[COLUMNS.index(column)]
+
+    def __len__(self):
+        return self._array.shape[1]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame({column: np.asarray(self[column]) for column in COLUMNS})
+
+
+def convert_irradiance_csv(csv_path, npy_path=None):
+    """
+    Convert an irradiance CSV (latitude, longitude and one value column) to a float32 .npy file.
+
+    Parameters:
+    - csv_path: Source CSV file
+    - npy_path: Destination (default: same name with a .npy extension)
+
+    Returns:
+    - Path of the written file
+    """
+    csv_path = Path(csv_path)
+    npy_path = Path(npy_path) if npy_path is not None else csv_path.with_suffix('.npy')
+    array = _read_irradiance_csv(csv_path)
+
+    tmp_path = npy_path.with_name(npy_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    tmp_path.replace(npy_path)
+    return npy_path
+
+
+def _read_irradiance_csv(csv_path):
+    df = pd.read_csv(csv_path)
+    value_column = next(column for column in df.columns if column not in ('latitude', 'longitude'))
+    return np.stack([df['latitude'].values, df['longitude'].values, df[value_column].values]).astype(np.float32)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_digest(name=DEFAULT_DATASET, data_dir=DATA_DIR):
+    """
+    SHA-256 of a dataset's source: its CSV, or the .npy file when there is no CSV.
+
+    Derived artefacts (the .npy store, irradiance tiles) record it to detect that
+    they are stale, independently of file modification times.
+    """
+    data_dir = Path(data_dir)
+    csv_path = data_dir / f"{name}.csv"
+    return _file_digest(csv_path if csv_path.exists() else data_dir / f"{name}.npy")
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def load_irradiance(name=DEFAULT_DATASET, data_dir=DATA_DIR) -> IrradianceData:
+    """
+    Open an irradiance dataset from data/, memory-mapped and read-only.
+
+    The .npy file is derived from the CSV of the same name and is not under
+    version control. It is built on first use and rebuilt when the SHA-256 of
+    the CSV no longer matches the one recorded next to it (<name>.npy.sha256),
+    so checkouts that reorder modification times do not rewrite it. Datasets
+    are opened once per process and paths do not depend on the working
+    directory.
+
+    Parameters:
+    - name: Dataset name, i.e. the file name without extension
+    - data_dir: Directory holding the datasets
+    """
+    data_dir = Path(data_dir)
+    key = (str(data_dir), name)
+    with _datasets_lock:
+        dataset = _datasets.get(key)
+        if dataset is not None:
+            return dataset
+
+        npy_path = data_dir / f"{name}.npy"
+        csv_path = data_dir / f"{name}.csv"
+        digest_path = data_dir / f"{name}.npy.sha256"
+        if csv_path.exists():
+            digest = dataset_digest(name, data_dir)
+            stored_digest = digest_path.read_text().strip() if digest_path.exists() else None
+            if not npy_path.exists() or stored_digest != digest:
+                try:
+                    convert_irradiance_csv(csv_path, npy_path)
+                    digest_path.write_text(digest + '\n')
+                except OSError as e:
+                    print(f"Could not write {npy_path}: {e}; reading {csv_path} instead")
+                    dataset = IrradianceData(_read_irradiance_csv(csv_path))
+                    _datasets[key] = dataset
+                    return dataset
+
+        dataset = IrradianceData(np.load(npy_path, mmap_mode='r'))
+        _datasets[key] = dataset
+        return dataset
+
+
+if __name__ == '__main__':
+    for csv_path in sorted(DATA_DIR.glob('*irradiance*.csv')):
+        npy_path = convert_irradiance_csv(csv_path)
+        npy_path.with_name(npy_path.name + '.sha256').write_text(dataset_digest(csv_path.stem) + '\n')
+        print(f"{csv_path.name} ({csv_path.stat().st_size} B) -> {npy_path.name} ({npy_path.stat().st_size} B)")
@@ -0,0 +1,254 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .get_irradiation import get_irradiance_interpolator, interpolate_irradiance
+from .irradiance_store import DATA_DIR, DEFAULT_DATASET, dataset_digest, load_irradiance
+
+DEFAULT_TILE_DIR = DATA_DIR / 'irradiance_tiles'
+# Coverage of the NASA POWER datasets in data/
+LATAM_BBOX = (-60.0, 20.0, -90.0, -30.0)
+# Bump when the raster layout changes so older tiles are treated as stale
+TILES_VERSION = 2
+
+
+class IrradianceTiles:
+    """
+    Precomputed irradiance raster read from fixed-size tiles.
+
+    The raster samples irradiance at nodes min_lat + i * resolution,
+    min_lon + j * resolution. It is cut into tiles of `tile_size` x `tile_size`
+    cells stored as float32 .npy files; each tile also holds the first node of
+    its neighbours, so every cell lies inside a single tile. Lookups read the
+    four corner nodes of each point from memory-mapped tiles and interpolate
+    bilinearly: the cost does not depend on how dense the source data was.
+
+    Layout of `tile_dir`:
+    - index.json: {"min_lat", "min_lon", "resolution", "n_lats", "n_lons", "tile_size", "source",
+      "source_digest", "version"}
+    - tile_{i}_{j}.npy: nodes [i*n:(i+1)*n + 1, j*n:(j+1)*n + 1] of the raster
+
+    Parameters:
+    - tile_dir: Directory written by build_irradiance_tiles
+    - max_open_tiles: Number of memory maps kept open at the same time
+    """
+
+    def __init__(self, tile_dir=DEFAULT_TILE_DIR, max_open_tiles=64):
+        self.tile_dir = Path(tile_dir)
+        index_path = self.tile_dir / 'index.json'
+        if not index_path.exists():
+            raise FileNotFoundError(f"No irradiance tiles in {self.tile_dir} "
+                                    f"(build them with python -m Python_files.irradiance_tiles)")
+        with open(index_path) as f:
+            index = json.load(f)
+        self.min_lat = index['min_lat']
+        self.min_lon = index['min_lon']
+        self.resolution = index['resolution']
+        self.n_lats = index['n_lats']
+        self.n_lons = index['n_lons']
+        self.tile_size = index['tile_size']
+        self.source = index['source']
+        self.source_digest = index.get('source_digest')
+        self.version = index.get('version', 1)
+        self.max_open_tiles = max_open_tiles
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        """True if the tiles were built by another layout version or from a dataset that has changed since."""
+        source = DEFAULT_DATASET if self.source == 'default' else self.source
+        return self.version != TILES_VERSION or self.source_digest != dataset_digest(source)
+
+    @property
+    def lats(self):
+        return self.min_lat + np.arange(self.n_lats) * self.resolution
+
+    @property
+    def lons(self):
+        return self.min_lon + np.arange(self.n_lons) * self.resolution
+
+    def _tile(self, i, j):
+        with self._lock:
+            tile = self._open.get((i, j))
+            if tile is None:
+                tile = np.load(self.tile_dir / f"tile_{i}_{j}.npy", mmap_mode='r')
+                self._open[(i, j)] = tile
+                while len(self._open) > self.max_open_tiles:
+                    self._open.popitem(last=False)
+            else:
+                self._open.move_to_end((i, j))
+            return tile
+
+    def lookup(self, lats, lons):
+        """
+        Irradiance at arbitrary coordinates, bilinearly interpolated from the raster.
+
+        Parameters:
+        - lats, lons: Arrays of target coordinates (any matching shape)
+
+        Returns:
+        - numpy.ndarray with the same shape as `lats`, NaN outside the raster
+        """
+        lats = np.asarray(lats, dtype=float)
+        shape = lats.shape
+        rows = (lats.ravel() - self.min_lat) / self.resolution
+        cols = (np.asarray(lons, dtype=float).ravel() - self.min_lon) / self.resolution
+        values = np.full(rows.size, np.nan)
+
+        # Small tolerance so points on the last node are not dropped by rounding
+        inside = ((rows >= -1e-9) & (rows <= self.n_lats - 1 + 1e-9) &
+                  (cols >= -1e-9) & (cols <= self.n_lons - 1 + 1e-9))
+        rows, cols = np.clip(rows[inside], 0, self.n_lats - 1), np.clip(cols[inside], 0, self.n_lons - 1)
+        r0 = np.minimum(np.floor(rows).astype(int), self.n_lats - 2)
+        c0 = np.minimum(np.floor(cols).astype(int), self.n_lons - 2)
+        fr, fc = rows - r0, cols - c0
+
+        n = self.tile_size
+        tile_keys = (r0 // n) * (self.n_lons // n + 1) + c0 // n
+        result = np.empty(rows.size)
+        # Group the points by tile with one sort instead of one mask per tile
+        order = np.argsort(tile_keys, kind='stable')
+        _, starts = np.unique(tile_keys[order], return_index=True)
+        for in_tile in np.split(order, starts[1:]):
+            ti, tj = r0[in_tile[0]] // n, c0[in_tile[0]] // n
+            tile = self._tile(ti, tj)
+            lr, lc = r0[in_tile] - ti * n, c0[in_tile] - tj * n
+            top = tile[lr, lc] * (1 - fc[in_tile]) + tile[lr, lc + 1] * fc[in_tile]
+            bottom = tile[lr + 1, lc] * (1 - fc[in_tile]) + tile[lr + 1, lc + 1] * fc[in_tile]
+            result[in_tile] = top * (1 - fr[in_tile]) + bottom * fr[in_tile]
+
+        values[inside] = result
+        return values.reshape(shape)
+
+    def area(self, min_lat, max_lat, min_lon, max_lon):
+        """
+        Raster nodes inside a bounding box, sliced from the tiles.
+
+        Returns:
+        - (lats, lons, values) with values of shape (len(lats), len(lons))
+        """
+        row0 = max(int(np.ceil((min_lat - self.min_lat) / self.resolution - 1e-9)), 0)
+        row1 = min(int(np.floor((max_lat - self.min_lat) / self.resolution + 1e-9)) + 1, self.n_lats)
+        col0 = max(int(np.ceil((min_lon - self.min_lon) / self.resolution - 1e-9)), 0)
+        col1 = min(int(np.floor((max_lon - self.min_lon) / self.resolution + 1e-9)) + 1, self.n_lons)
+        out = np.empty((max(row1 - row0, 0), max(col1 - col0, 0)), dtype=np.float32)
+
+        n = self.tile_size
+        # The last node of the raster is only stored as the overlap of the last tile
+        last_i, last_j = (self.n_lats - 2) // n, (self.n_lons - 2) // n
+        if out.size:
+            for i in range(min(row0 // n, last_i), min((row1 - 1) // n, last_i) + 1):
+                for j in range(min(col0 // n, last_j), min((col1 - 1) // n, last_j) + 1):
+                    r0, r1 = max(row0, i * n), min(row1, (i + 1) * n + 1)
+                    c0, c1 = max(col0, j * n), min(col1, (j + 1) * n + 1)
+                    out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = self._tile(i, j)[r0 - i * n:r1 - i * n,
+                                                                                        c0 - j * n:c1 - j * n]
+        return self.lats[row0:row1], self.lons[col0:col1], out
+
+
+def build_irradiance_tiles(tile_dir=DEFAULT_TILE_DIR, resolution=0.05, tile_size=256, bbox=LATAM_BBOX, source=None):
+    """
+    Rasterise an irradiance dataset over Latin America into fixed-size tiles.
+
+    Each tile is evaluated with the dataset's interpolator and written on its
+    own, so memory stays at about one tile whatever the resolution.
+
+    Parameters:
+    - tile_dir: Output directory
+    - resolution: Raster step in degrees
+    - tile_size: Number of cells per tile side
+    - bbox: (min_lat, max_lat, min_lon, max_lon) covered by the raster
+    - source: Name of a dataset in data/ (default: the irradiance_store default)
+
+    Returns:
+    - IrradianceTiles opened on the written directory
+    """
+    tile_dir = Path(tile_dir)
+    tile_dir.mkdir(parents=True, exist_ok=True)
+    dataset = load_irradiance() if source is None else load_irradiance(source)
+    interpolator = get_irradiance_interpolator(dataset)
+
+    min_lat, max_lat, min_lon, max_lon = bbox
+    n_lats = int(round((max_lat - min_lat) / resolution)) + 1
+    n_lons = int(round((max_lon - min_lon) / resolution)) + 1
+    for i in range(0, max(n_lats - 1, 1), tile_size):
+        for j in range(0, max(n_lons - 1, 1), tile_size):
+            tile_lats = min_lat + np.arange(i, min(i + tile_size + 1, n_lats)) * resolution
+            tile_lons = min_lon + np.arange(j, min(j + tile_size + 1, n_lons)) * resolution
+            tile_lat_grid, tile_lon_grid = np.meshgrid(tile_lats, tile_lons, indexing='ij')
+            tile = interpolator(tile_lat_grid, tile_lon_grid).astype(np.float32)
+            np.save(tile_dir / f"tile_{i // tile_size}_{j // tile_size}.npy", tile)
+
+    with open(tile_dir / 'index.json', 'w') as f:
+        json.dump({'min_lat': min_lat, 'min_lon': min_lon, 'resolution': resolution, 'n_lats': n_lats,
+                   'n_lons': n_lons, 'tile_size': tile_size, 'source': source or 'default',
+                   'source_digest': dataset_digest(source or DEFAULT_DATASET), 'version': TILES_VERSION}, f)
+    print(f"Irradiance raster of {n_lats}x{n_lons} nodes written to {tile_dir}")
+    return IrradianceTiles(tile_dir)
+
+
+_tiles = None
+_tiles_index_mtime = None
+_tiles_lock = threading.Lock()
+
+
+def _default_tiles():
+    """
+    IrradianceTiles of DEFAULT_TILE_DIR, or None when they are missing or stale.
+
+    The index is checked again whenever its modification time changes, so
+    tiles built (or rebuilt) while the process runs are picked up.
+    """
+    global _tiles, _tiles_index_mtime
+    index_path = DEFAULT_TILE_DIR / 'index.json'
+    try:
+        mtime = index_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    with _tiles_lock:
+        if mtime != _tiles_index_mtime:
+            _tiles_index_mtime = mtime
+            _tiles = None
+            if mtime is not None:
+                tiles = IrradianceTiles(DEFAULT_TILE_DIR)
+                if tiles.is_stale():
+                    print(f"Ignoring stale irradiance tiles in {DEFAULT_TILE_DIR} "
+                          f"(rebuild them with python -m Python_files.irradiance_tiles)")
+                else:
+                    _tiles = tiles
+        return _tiles
+
+
+def lookup_irradiance(lats, lons):
+    """
+    Irradiance at arbitrary coordinates, from the prebuilt tiles when they exist and are up to date.
+
+    Points the tiles do not cover (or every point, when the tiles have not been
+    built or are stale) are interpolated from the irradiance dataset instead.
+    """
+    tiles = _default_tiles()
+    if tiles is None:
+        return interpolate_irradiance(load_irradiance(), lats, lons)
+
+    values = tiles.lookup(lats, lons)
+    missing = np.isnan(values)
+    if np.any(missing):
+        values[missing] = interpolate_irradiance(load_irradiance(), np.asarray(lats)[missing],
+                                                 np.asarray(lons)[missing])
+    return values
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the LatAm irradiance raster tiles")
+    parser.add_argument('--resolution', type=float, default=0.05, help="Raster step in degrees")
+    parser.add_argument('--tile-size', type=int, default=256)
+    parser.add_argument('--source', default=None, help="Dataset name in data/")
+    parser.add_argument('--out', default=str(DEFAULT_TILE_DIR))
+    args = parser.parse_args()
+
+    build_irradiance_tiles(args.out, resolution=args.resolution, tile_size=args.tile_size, source=args.source)
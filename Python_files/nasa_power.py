@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+
+from .http_session import get_session
+
+POWER_URL = os.environ.get("NASA_POWER_URL", "https://power.larc.nasa.gov/api/temporal/monthly/point")
+PARAMETER = "ALLSKY_SFC_SW_DWN"  # All-sky surface shortwave downward irradiance
+FILL_VALUE = -999.0
+
+
+def fetch_monthly_irradiance(lat, lon, start_year, end_year, url=None, session=None, timeout=60):
+    """
+    Fetch the monthly ALLSKY_SFC_SW_DWN series of one location from NASA POWER.
+
+    Parameters:
+    - lat, lon: Coordinates of the location
+    - start_year, end_year: Inclusive range of years
+    - url: Monthly point endpoint (default: POWER_URL, overridable with NASA_POWER_URL)
+    - session: requests.Session to use (default: shared session)
+    - timeout: Request timeout in seconds
+
+    Returns:
+    - dict mapping (year, month) to irradiance, without annual means and fill values
+    """
+    params = {
+        "parameters": PARAMETER,
+        "community": "RE",  # Renewable Energy community
+        "latitude": lat,
+        "longitude": lon,
+        "start": start_year,
+        "end": end_year,
+        "format": "JSON"
+    }
+    response = (session or get_session()).get(url or POWER_URL, params=params, timeout=timeout)
+    response.raise_for_status()
+    return parse_monthly_series(response.json())
+
+
+def parse_monthly_series(data):
+    """
+    Extract the monthly values of a NASA POWER monthly point response.
+
+    Keys look like "202301"; month 13 holds the annual mean and is skipped.
+    """
+    series = {}
+    for key, value in data['properties']['parameter'][PARAMETER].items():
+        year, month = int(key[:4]), int(key[4:])
+        if month <= 12 and value is not None and value != FILL_VALUE:
+            series[(year, month)] = float(value)
+    return series
+
+
+def fetch_yearly_avg_irradiance(lat, lon, start_year, end_year, **kwargs):
+    """
+    Mean irradiance of a location over the monthly series of a range of years.
+
+    Returns:
+    - (lat, lon, yearly_avg) with yearly_avg None if no valid month was returned
+    """
+    series = fetch_monthly_irradiance(lat, lon, start_year, end_year, **kwargs)
+    yearly_avg = float(np.mean(list(series.values()))) if series else None
+    return lat, lon, yearly_avg
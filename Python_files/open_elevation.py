@@ -0,0 +1,188 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .http_session import get_session
+from .resilience import CircuitBreaker, ResilientCaller, RetryBudget, RetryPolicy
+
+OPEN_ELEVATION_URL = os.environ.get("OPEN_ELEVATION_URL", "https://api.open-elevation.com/api/v1/lookup")
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = (3.05, 20)  # (connect, read) seconds
+
+
+def _fetch_batch(session, url, lats, lons, timeout=None):
+    points = [{"latitude": float(lat), "longitude": float(lon)} for lat, lon in zip(lats, lons)]
+    response = session.post(url, json={"locations": points}, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    return np.array([point["elevation"] for point in data["results"]], dtype=float)
+
+
+def _map_batches(lats, lons, batch_size, max_workers, fetch_batch):
+    # Run fetch_batch over consecutive batches, concurrently, and reassemble the results in order
+    elevations = np.empty(lats.size, dtype=float)
+    starts = range(0, lats.size, batch_size)
+    if len(starts) <= 1 or max_workers <= 1:
+        for start in starts:
+            stop = start + batch_size
+            elevations[start:stop] = fetch_batch(lats[start:stop], lons[start:stop])
+        return elevations
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            start: executor.submit(fetch_batch, lats[start:start + batch_size], lons[start:start + batch_size])
+            for start in starts
+        }
+        for start, future in futures.items():
+            elevations[start:start + batch_size] = future.result()
+
+    return elevations
+
+
+def fetch_elevations(lats, lons, url=None, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                     session=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetch the elevation of a list of points from an open-elevation compatible API.
+
+    The points are split in batches of at most `batch_size` locations which are
+    posted concurrently by `max_workers` threads over a pooled session. Results
+    are written back in the original order. Any failed batch raises.
+
+    Parameters:
+    - lats, lons: 1-D arrays of coordinates
+    - url: Lookup endpoint (default: OPEN_ELEVATION_URL, overridable with the
+      OPEN_ELEVATION_URL environment variable)
+    - batch_size: Maximum number of locations per request
+    - max_workers: Number of concurrent requests
+    - session: requests.Session to use (default: shared pooled session)
+    - timeout: requests timeout, in seconds or as a (connect, read) tuple
+
+    Returns:
+    - numpy.ndarray with one elevation (m) per point
+    """
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    url = url or OPEN_ELEVATION_URL
+    session = session or get_session(max_workers)
+    return _map_batches(lats, lons, batch_size, max_workers,
+                        lambda batch_lats, batch_lons: _fetch_batch(session, url, batch_lats, batch_lons, timeout))
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url=None):
+    """Return the CircuitBreaker shared by every client of an endpoint."""
+    url = url or OPEN_ELEVATION_URL
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(url)
+        if breaker is None:
+            breaker = _circuit_breakers[url] = CircuitBreaker()
+        return breaker
+
+
+_retry_budgets = {}
+_retry_budgets_lock = threading.Lock()
+
+
+def get_retry_budget(url=None):
+    """Return the RetryBudget shared by every client of an endpoint."""
+    url = url or OPEN_ELEVATION_URL
+    with _retry_budgets_lock:
+        budget = _retry_budgets.get(url)
+        if budget is None:
+            budget = _retry_budgets[url] = RetryBudget()
+        return budget
+
+
+_hedge_executors = {}
+_hedge_executors_lock = threading.Lock()
+
+
+def get_hedge_executor(url=None, max_workers=2 * DEFAULT_MAX_WORKERS):
+    """Return the ThreadPoolExecutor shared by every hedging client of an endpoint with this pool size."""
+    key = (url or OPEN_ELEVATION_URL, max_workers)
+    with _hedge_executors_lock:
+        executor = _hedge_executors.get(key)
+        if executor is None:
+            executor = _hedge_executors[key] = ThreadPoolExecutor(max_workers=max_workers,
+                                                                 thread_name_prefix='elevation-hedge')
+        return executor
+
+
+class ElevationClient:
+    """
+    Fault-tolerant open-elevation client.
+
+    Batches are fetched like in fetch_elevations, but every request has a
+    timeout, failed requests are retried with jittered exponential backoff
+    within a retry budget, slow requests can be hedged with a duplicate, and a
+    circuit breaker shared per endpoint makes calls fail fast while the
+    upstream is down. A batch that still fails is returned as NaN instead of
+    raising, and the client counts how many points were real or degraded.
+
+    Parameters:
+    - url, batch_size, max_workers, session, timeout: As in fetch_elevations
+    - retry_policy: RetryPolicy (default: 3 attempts, retries capped at 20% of the requests to the
+      endpoint by its shared retry budget)
+    - circuit_breaker: CircuitBreaker (default: shared breaker of the endpoint), False to disable
+    - hedge_delay: Seconds before a duplicate of a slow request is sent (default: no hedging); hedged
+      requests run on the executor shared by the endpoint's clients
+    """
+
+    def __init__(self, url=None, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS, session=None,
+                 timeout=DEFAULT_TIMEOUT, retry_policy=None, circuit_breaker=None, hedge_delay=None):
+        self.url = url or OPEN_ELEVATION_URL
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.session = session
+        self.timeout = timeout
+        if circuit_breaker is None:
+            circuit_breaker = get_circuit_breaker(self.url)
+        if retry_policy is None:
+            retry_policy = RetryPolicy(budget=get_retry_budget(self.url))
+        executor = get_hedge_executor(self.url, 2 * max_workers) if hedge_delay is not None else None
+        self.caller = ResilientCaller(retry_policy, circuit_breaker or None, hedge_delay, executor=executor)
+        self._lock = threading.Lock()
+        self.real_points = 0
+        self.degraded_points = 0
+
+    def _fetch_batch(self, lats, lons):
+        session = self.session or get_session(self.max_workers)
+        try:
+            return self.caller.call(lambda: _fetch_batch(session, self.url, lats, lons, self.timeout))
+        except Exception as e:
+            print(f"Elevation batch of {len(lats)} points failed: {e}")
+            return np.full(len(lats), np.nan)
+
+    def fetch(self, lats, lons):
+        """
+        Returns:
+        - numpy.ndarray with one elevation (m) per point, NaN where the upstream could not answer
+        """
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        elevations = _map_batches(lats, lons, self.batch_size, self.max_workers, self._fetch_batch)
+
+        degraded = int(np.count_nonzero(np.isnan(elevations)))
+        with self._lock:
+            self.real_points += elevations.size - degraded
+            self.degraded_points += degraded
+        return elevations
+
+    def report(self):
+        """
+        Returns:
+        - dict with real/degraded point counts, request outcomes and the circuit breaker state
+        """
+        with self._lock:
+            report = {'real_points': self.real_points, 'degraded_points': self.degraded_points}
+        report.update(self.caller.stats)
+        breaker = self.caller.circuit_breaker
+        report['circuit'] = breaker.state if breaker is not None else 'disabled'
+        return report
@@ -0,0 +1,114 @@
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .elevation_cache import ElevationTileCache
+from .elevation_sources import OpenElevationSource
+from .get_energy import get_energy_production_grid
+from .open_elevation import ElevationClient
+from .resilience import CircuitBreaker, RetryBudget, RetryPolicy
+from .stub_servers import StubServer
+
+# Capitals users typically click on during demos
+DEFAULT_LOCATIONS = [
+    (-33.4489, -70.6693),  # Santiago
+    (-12.0464, -77.0428),  # Lima
+    (4.7110, -74.0721),    # Bogotá
+    (-0.1807, -78.4678),   # Quito
+    (-16.4897, -68.1193),  # La Paz
+    (-34.6037, -58.3816),  # Buenos Aires
+    (-15.7939, -47.8828),  # Brasília
+    (19.4326, -99.1332),   # Mexico City
+]
+
+
+def run_pipeline_benchmark(locations=DEFAULT_LOCATIONS, radius_km=2, resolution=100, concurrency=4, repeats=1,
+                           server=None, use_cache=True, client_kwargs=None, **server_kwargs):
+    """
+    Time the viability pipeline (terrain, irradiance, energy) against a local stand-in server.
+
+    Every run starts with an empty elevation cache, so results only depend on
+    the arguments and the stand-in's seed.
+
+    Parameters:
+    - locations: (lat, lon) centres of the assessed areas
+    - radius_km: Half side of each assessed box, as in the Viabilidad view
+    - resolution: Grid resolution in meters
+    - concurrency: Number of assessments running at the same time
+    - repeats: Number of passes over the locations
+    - server: Running StubServer to use (default: a new one built from server_kwargs)
+    - use_cache: Route elevations through a fresh ElevationTileCache
+    - client_kwargs: ElevationClient options (timeout, retry_policy, hedge_delay, ...)
+    - server_kwargs: StubServer options (latency, error_rate, cassette, seed, ...)
+
+    Returns:
+    - dict with latency percentiles (s), throughput, upstream request counts and the
+      elevation client report (real/degraded points, retries, hedges, ...)
+    """
+    owns_server = server is None
+    if owns_server:
+        server = StubServer(**server_kwargs).start()
+
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ElevationTileCache(cache_dir) if use_cache else False
+            client_kwargs = dict(client_kwargs or {})
+            client_kwargs.setdefault('circuit_breaker', CircuitBreaker())
+            client_kwargs.setdefault('retry_policy', RetryPolicy(budget=RetryBudget()))
+            client = ElevationClient(url=server.elevation_url, **client_kwargs)
+            source = OpenElevationSource(cache=cache, client=client)
+            radius_degree = radius_km / 111
+
+            def assess(center):
+                lat, lon = center
+                start = time.perf_counter()
+                get_energy_production_grid(lat - radius_degree, lat + radius_degree, lon - radius_degree,
+                                           lon + radius_degree, resolution=resolution, elevation_source=source)
+                return time.perf_counter() - start
+
+            server.reset_stats()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                durations = np.array(list(executor.map(assess, list(locations) * repeats)))
+            elapsed = time.perf_counter() - start
+    finally:
+        if owns_server:
+            server.stop()
+
+    results = {
+        'assessments': durations.size,
+        'p50': float(np.percentile(durations, 50)),
+        'p95': float(np.percentile(durations, 95)),
+        'max': float(durations.max()),
+        'throughput': durations.size / elapsed,
+        'upstream_requests': server.request_count,
+        'upstream_errors': server.error_count,
+    }
+    results.update(client.report())
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of the viability pipeline")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--tail-rate', type=float, default=0.0, help="Fraction of slow upstream responses")
+    parser.add_argument('--tail-latency', type=float, default=1.0)
+    parser.add_argument('--hedge-delay', type=float, default=None, help="Hedge requests slower than this (s)")
+    parser.add_argument('--timeout', type=float, default=20.0, help="Per-request read timeout (s)")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--cassette', default=None, help="Serve recorded responses from this cassette")
+    args = parser.parse_args()
+
+    results = run_pipeline_benchmark(concurrency=args.concurrency, repeats=args.repeats, latency=args.latency,
+                                     error_rate=args.error_rate, tail_rate=args.tail_rate,
+                                     tail_latency=args.tail_latency, cassette=args.cassette,
+                                     client_kwargs={'hedge_delay': args.hedge_delay,
+                                                    'timeout': (3.05, args.timeout)})
+    for name, value in results.items():
+        print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+
+from .irradiance_store import DATA_DIR
+from .nasa_power import fetch_monthly_irradiance
+from .resilience import RetryPolicy
+
+DEFAULT_CHECKPOINT = DATA_DIR / 'power_harvest.jsonl'
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Asyncio rate limiter: at most `rate` acquisitions per second, with bursts of up to `burst`.
+
+    `pause(seconds)` blocks every acquisition for a while, e.g. after the
+    upstream answered 429 Too Many Requests.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _cell_key(lat, lon):
+    return f"{lat:.6f},{lon:.6f}"
+
+
+class HarvestCheckpoint:
+    """
+    Append-only JSONL record of the harvested cells.
+
+    Each line holds one cell: {"lat", "lon", "start_year", "end_year",
+    "fetched_at", "series": {"YYYYMM": value}}. Lines are flushed as soon as a
+    cell is fetched, so an interrupted harvest loses at most the requests in
+    flight. Later lines override earlier ones for the same cell and a torn last
+    line is ignored.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT):
+        self.path = Path(path)
+        self.cells = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.cells[_cell_key(entry['lat'], entry['lon'])] = entry
+        self._file = None
+
+    def is_fresh(self, lat, lon, start_year, end_year, max_age=None):
+        """Whether a cell was fetched for the whole year range, less than `max_age` seconds ago."""
+        entry = self.cells.get(_cell_key(lat, lon))
+        if entry is None or entry['start_year'] > start_year or entry['end_year'] < end_year:
+            return False
+        return max_age is None or time.time() - entry['fetched_at'] < max_age
+
+    def record(self, lat, lon, start_year, end_year, series):
+        entry = {'lat': lat, 'lon': lon, 'start_year': start_year, 'end_year': end_year, 'fetched_at': time.time(),
+                 'series': {f"{year}{month:02d}": value for (year, month), value in sorted(series.items())}}
+        self.cells[_cell_key(lat, lon)] = entry
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def series(self, lat, lon):
+        """Monthly series of a cell as a dict mapping (year, month) to irradiance (empty if never fetched)."""
+        entry = self.cells.get(_cell_key(lat, lon))
+        if entry is None:
+            return {}
+        return {(int(key[:4]), int(key[4:])): value for key, value in entry['series'].items()}
+
+    def compact(self):
+        """Rewrite the file with one line per cell."""
+        self.close()
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            for entry in self.cells.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def _fetch_cell(lat, lon, start_year, end_year, url, bucket, retry_policy, stats, stop):
+    # Returns None without requesting once `stop` is set
+    for attempt in range(retry_policy.max_attempts):
+        await bucket.acquire()
+        if stop.is_set():
+            return None
+        try:
+            return await asyncio.to_thread(fetch_monthly_irradiance, lat, lon, start_year, end_year, url=url)
+        except requests.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            if (status is not None and status not in RETRYABLE_STATUS) or attempt == retry_policy.max_attempts - 1:
+                raise
+            delay = retry_policy.backoff(attempt)
+            if status == 429:
+                retry_after = e.response.headers.get('Retry-After', '')
+                delay = max(delay, float(retry_after) if retry_after.isdigit() else retry_policy.base_delay)
+                bucket.pause(delay)
+            stats['retries'] += 1
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def harvest_power_grid(lats, lons, start_year, end_year, checkpoint=DEFAULT_CHECKPOINT, concurrency=8, rate=5.0,
+                             max_age=None, url=None, retry_policy=None):
+    """
+    Fetch the NASA POWER monthly series of every cell of a lat/lon grid, resumably.
+
+    Cells already in the checkpoint for the requested years, and younger than
+    `max_age`, are skipped; the others are fetched with at most `concurrency`
+    requests in flight and `rate` requests per second, and appended to the
+    checkpoint as they arrive. Failed cells are left out of the checkpoint and
+    retried by the next harvest.
+
+    Any other error (e.g. a malformed answer) stops the harvest: no new
+    request is started, the requests in flight are awaited and recorded, then
+    the checkpoint is closed and the error raised. If the harvest itself is
+    cancelled, its tasks are cancelled and awaited before the checkpoint is
+    closed, so nothing is written to it afterwards.
+
+    Parameters:
+    - lats, lons: 1-D grid axes
+    - start_year, end_year: Inclusive range of years
+    - checkpoint: HarvestCheckpoint or path of its JSONL file
+    - concurrency: Maximum number of requests in flight
+    - rate: Maximum number of requests per second (NASA POWER throttles bursts)
+    - max_age: Refetch cells older than this many seconds (default: never)
+    - url: Monthly point endpoint (default: nasa_power.POWER_URL)
+    - retry_policy: RetryPolicy for timeouts, 429 and 5xx answers
+
+    Returns:
+    - dict with the number of fetched, skipped and failed cells and of retries
+    """
+    if not isinstance(checkpoint, HarvestCheckpoint):
+        checkpoint = HarvestCheckpoint(checkpoint)
+    retry_policy = retry_policy or RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=60.0)
+    bucket = TokenBucket(rate, burst=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {'fetched': 0, 'skipped': 0, 'failed': 0, 'retries': 0}
+    stop = asyncio.Event()
+
+    cells = [(float(lat), float(lon)) for lat in lats for lon in lons]
+    pending = [cell for cell in cells if not checkpoint.is_fresh(*cell, start_year, end_year, max_age)]
+    stats['skipped'] = len(cells) - len(pending)
+    print(f"Harvesting {len(pending)} of {len(cells)} cells ({stats['skipped']} up to date)")
+
+    async def harvest_cell(lat, lon):
+        async with semaphore:
+            if stop.is_set():
+                return
+            try:
+                series = await _fetch_cell(lat, lon, start_year, end_year, url, bucket, retry_policy, stats, stop)
+            except requests.RequestException as e:
+                stats['failed'] += 1
+                print(f"Failed to fetch ({lat}, {lon}): {e}")
+                return
+            except Exception:
+                stats['failed'] += 1
+                stop.set()
+                raise
+        if series is not None:
+            checkpoint.record(lat, lon, start_year, end_year, series)
+            stats['fetched'] += 1
+
+    tasks = [asyncio.ensure_future(harvest_cell(lat, lon)) for lat, lon in pending]
+    try:
+        # Every task runs to completion, a failing one only stops the others from starting new requests
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    except BaseException:
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        checkpoint.close()
+    print(f"Fetched {stats['fetched']} cells, {stats['failed']} failed")
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+    return stats
+
+
+def harvest_irradiance_grid(min_lat=-60, max_lat=20, min_lon=-90, max_lon=-30, resolution=2.0, start_year=2014,
+                            end_year=2023, checkpoint=DEFAULT_CHECKPOINT, csv_path=None, **kwargs) -> pd.DataFrame:
+    """
+    Harvest a grid and return its yearly mean irradiance, as in data/irradiance_data_full_res2.csv.
+
+    Extra keyword arguments are forwarded to harvest_power_grid (concurrency,
+    rate, max_age, url, ...). Cells without data are left out.
+
+    Parameters:
+    - min_lat, max_lat, min_lon, max_lon: Bounds of the grid
+    - resolution: Grid step in degrees
+    - start_year, end_year: Inclusive range of years averaged
+    - checkpoint: HarvestCheckpoint or path of its JSONL file
+    - csv_path: Also save the DataFrame to this CSV file
+
+    Returns:
+    - DataFrame with latitude, longitude and irradiance columns
+    """
+    lats = np.arange(min_lat, max_lat + resolution / 2, resolution)
+    lons = np.arange(min_lon, max_lon + resolution / 2, resolution)
+    if not isinstance(checkpoint, HarvestCheckpoint):
+        checkpoint = HarvestCheckpoint(checkpoint)
+    asyncio.run(harvest_power_grid(lats, lons, start_year, end_year, checkpoint=checkpoint, **kwargs))
+    checkpoint.compact()
+
+    rows = []
+    for lat in lats:
+        for lon in lons:
+            values = [value for (year, _), value in checkpoint.series(float(lat), float(lon)).items()
+                      if start_year <= year <= end_year]
+            if values:
+                rows.append((float(lat), float(lon), float(np.mean(values))))
+    irradiance_df = pd.DataFrame(rows, columns=['latitude', 'longitude', 'irradiance'])
+
+    if csv_path is not None:
+        irradiance_df.to_csv(csv_path, index=False)
+        print(f"Data saved to {csv_path}")
+    return irradiance_df
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Harvest NASA POWER monthly irradiance over Latin America")
+    parser.add_argument('--resolution', type=float, default=2.0, help="Grid step in degrees")
+    parser.add_argument('--start-year', type=int, default=2014)
+    parser.add_argument('--end-year', type=int, default=2023)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=5.0, help="Requests per second")
+    parser.add_argument('--max-age-days', type=float, default=None, help="Refetch cells older than this")
+    parser.add_argument('--url', default=None, help="Monthly point endpoint (e.g. a StubServer power_url)")
+    parser.add_argument('--checkpoint', default=str(DEFAULT_CHECKPOINT))
+    parser.add_argument('--csv', default=None, help="Output CSV of yearly means")
+    args = parser.parse_args()
+
+    max_age = args.max_age_days * 86400 if args.max_age_days is not None else None
+    df = harvest_irradiance_grid(resolution=args.resolution, start_year=args.start_year, end_year=args.end_year,
+                                 checkpoint=args.checkpoint, csv_path=args.csv, concurrency=args.concurrency,
+                                 rate=args.rate, max_age=max_age, url=args.url)
+    print(f"{len(df)} cells with data")
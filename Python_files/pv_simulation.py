@@ -0,0 +1,293 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+HOURS_PER_YEAR = 8760
+SOLAR_CONSTANT = 1361.0  # W/m²
+# Cumulative days at the start of each month of a non-leap year
+_MONTH_STARTS = np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+# Points x hours evaluated at once; a dozen temporaries of this size are alive during a chunk
+DEFAULT_CHUNK_ELEMENTS = 1 << 20
+
+
+def _time_terms():
+    """
+    Hour-only terms of the solar geometry for the 8760 hours of a non-leap year (UTC, at mid-hour).
+
+    Returns:
+    - declination (rad), hour_angle_utc (deg, hour angle at longitude 0), extraterrestrial normal
+      irradiance (W/m²) and month (0-11) of every hour
+    """
+    hours = np.arange(HOURS_PER_YEAR) + 0.5
+    day = np.floor(hours / 24)
+    # Fractional year (Spencer, 1971)
+    gamma = 2 * np.pi * (day + (hours % 24 - 12) / 24) / 365
+    declination = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+                   - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+                   - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                                 - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))  # minutes
+    hour_angle_utc = 15 * (hours % 24 + equation_of_time / 60 - 12)
+    extraterrestrial = SOLAR_CONSTANT * (1.000110 + 0.034221 * np.cos(gamma) + 0.001280 * np.sin(gamma)
+                                         + 0.000719 * np.cos(2 * gamma) + 0.000077 * np.sin(2 * gamma))
+    month = np.searchsorted(_MONTH_STARTS, day, side='right') - 1
+    return declination, hour_angle_utc, extraterrestrial, month
+
+
+def solar_position(lats, lons):
+    """
+    Sun direction of every (point, hour) of the year as east, north and up components of a unit vector.
+
+    Parameters:
+    - lats, lons: 1-D arrays of point coordinates (degrees)
+
+    Returns:
+    - east, north, up: arrays of shape (points, 8760); up is the cosine of the solar zenith angle
+    """
+    declination, hour_angle_utc, _, _ = _time_terms()
+    latitude = np.radians(np.asarray(lats, dtype=float))[:, None]
+    hour_angle = np.radians(hour_angle_utc[None, :] + np.asarray(lons, dtype=float)[:, None])
+    sin_dec, cos_dec = np.sin(declination)[None, :], np.cos(declination)[None, :]
+    cos_hour_angle = np.cos(hour_angle)
+
+    east = -cos_dec * np.sin(hour_angle)
+    north = sin_dec * np.cos(latitude) - cos_dec * np.sin(latitude) * cos_hour_angle
+    up = sin_dec * np.sin(latitude) + cos_dec * np.cos(latitude) * cos_hour_angle
+    return east, north, up
+
+
+def _erbs_diffuse_fraction(clearness):
+    """Diffuse fraction of global horizontal irradiance from the clearness index (Erbs et al., 1982)."""
+    polynomial = 0.9511 + clearness * (-0.1604 + clearness * (4.388 + clearness * (-16.638 + clearness * 12.336)))
+    return np.where(clearness <= 0.22, 1 - 0.09 * clearness, np.where(clearness <= 0.8, polynomial, 0.165))
+
+
+def _simulate_chunk(lats, lons, tilt, azimuth, daily_irradiance, panel_efficiency, panel_area, albedo, losses,
+                    hourly, horizon=None):
+    """
+    Hourly AC-side production (W) of a chunk of points over a year.
+
+    daily_irradiance is (points, 12): mean daily global horizontal irradiation
+    of each month in kWh/m²/day. horizon is None or (points, sectors) horizon
+    angles in degrees.
+    """
+    _, _, extraterrestrial, month = _time_terms()
+    east, north, up = solar_position(lats, lons)
+    sun_up = np.maximum(up, 0)
+
+    # Spread each day's irradiation over its hours in proportion to the extraterrestrial horizontal irradiance
+    horizontal_extraterrestrial = extraterrestrial[None, :] * sun_up
+    daily_extraterrestrial = horizontal_extraterrestrial.reshape(len(lats), 365, 24).sum(axis=2)
+    day_month = month[::24]
+    daily_global = daily_irradiance[:, day_month] * 1000  # Wh/m²/day
+    with np.errstate(invalid='ignore', divide='ignore'):
+        clearness = np.where(daily_extraterrestrial > 0, daily_global / daily_extraterrestrial, 0)
+    # Clipping only matters near the polar night, where the daily means cannot be met by a clear sky
+    clearness = np.repeat(np.clip(clearness, 0, 1), 24, axis=1)
+    ghi = horizontal_extraterrestrial * clearness
+
+    # Diffuse / beam split, no beam for a sun within ~4° of the horizon
+    dhi = ghi * _erbs_diffuse_fraction(clearness)
+    low_sun = up < 0.065
+    dhi[low_sun] = ghi[low_sun]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dni = np.where(low_sun, 0, (ghi - dhi) / np.where(low_sun, 1, up))
+
+    if horizon is not None:
+        # No beam while the sun is behind the horizon of its azimuth sector, diffuse from the visible sky only
+        n_sectors = horizon.shape[1]
+        sun_azimuth = np.mod(np.arctan2(east, north), 2 * np.pi)
+        sector = np.rint(sun_azimuth * (n_sectors / (2 * np.pi))).astype(int) % n_sectors
+        horizon_sin = np.sin(np.radians(horizon))
+        dni[up < np.take_along_axis(horizon_sin, sector, axis=1)] = 0
+        dhi *= np.mean(np.cos(np.radians(np.clip(horizon, 0, 90))) ** 2, axis=1)[:, None]
+
+    # Plane of array (isotropic sky): beam on the tilted plane, sky diffuse and ground-reflected
+    tilt = np.radians(tilt)[:, None]
+    azimuth = np.radians(azimuth)[:, None]
+    cos_tilt = np.cos(tilt)
+    cos_incidence = (east * np.sin(tilt) * np.sin(azimuth) + north * np.sin(tilt) * np.cos(azimuth)
+                     + up * cos_tilt)
+    poa = dni * np.maximum(cos_incidence, 0) + dhi * (1 + cos_tilt) / 2 + ghi * albedo * (1 - cos_tilt) / 2
+
+    power = poa * (panel_efficiency * panel_area * (1 - losses))
+    annual_energy = power.sum(axis=1) / 1000  # kWh per year
+    return annual_energy, (power.astype(np.float32) if hourly else None)
+
+
+def simulate_pv(lats, lons, irradiance, tilt=None, azimuth=None, panel_efficiency=0.2, panel_area=1.0, albedo=0.2,
+                losses=0.0, horizon=None, hourly=False, chunk_elements=DEFAULT_CHUNK_ELEMENTS, max_workers=1,
+                out_dir=None):
+    """
+    Simulate hourly PV production over a full year for many points.
+
+    For every point and every hour of a non-leap year (UTC, at mid-hour) it
+    computes the sun position, splits the hourly global horizontal
+    irradiance into beam and diffuse (Erbs), transposes it to the panel plane
+    (isotropic sky model with ground reflection) and converts it to power.
+    Hourly irradiance is synthesised from daily means by spreading each day's
+    irradiation in proportion to the extraterrestrial irradiance.
+
+    Points are processed in chunks of about `chunk_elements` point-hours, so
+    memory stays bounded whatever the number of points. Chunks can be spread
+    over several processes.
+
+    Parameters:
+    - lats, lons: 1-D arrays of point coordinates (degrees)
+    - irradiance: Mean daily global horizontal irradiation (kWh/m²/day) of each point, as an array of
+      shape (points,) or (points, 12) for monthly means
+    - tilt, azimuth: Panel tilt and azimuth (degrees, azimuth clockwise from North) of each point or scalars;
+      pass the terrain slope and aspect for panels mounted on the ground. When both are None the panels are
+      tilted at |latitude| facing the equator.
+    - panel_efficiency, panel_area, losses: Conversion of plane-of-array irradiance to power
+    - albedo: Ground reflectance
+    - horizon: Optional (points, sectors) terrain horizon angles in degrees (see horizon.compute_horizon);
+      beam irradiance is dropped while the sun is behind it and sky diffuse is scaled by the sky view factor
+    - hourly: Also return the (points, 8760) hourly production in W
+    - chunk_elements: Number of point-hours evaluated at once
+    - max_workers: Number of worker processes (1 computes in-process, None uses every core)
+    - out_dir: If given with hourly=True, the hourly production is written to a memory-mapped hourly.npy there
+
+    Returns:
+    - annual_energy: (points,) kWh per year
+    - hourly: (points, 8760) float32 W, or None
+    """
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    n = lats.size
+    irradiance = np.asarray(irradiance, dtype=float).reshape(n, -1)
+    daily_irradiance = np.broadcast_to(irradiance, (n, 12)) if irradiance.shape[1] == 1 else irradiance
+    if tilt is None and azimuth is None:
+        tilt = np.abs(lats)
+        azimuth = np.where(lats > 0, 180.0, 0.0)
+    tilt = np.broadcast_to(np.asarray(tilt, dtype=float).ravel(), (n,))
+    azimuth = np.broadcast_to(np.asarray(azimuth, dtype=float).ravel(), (n,))
+    if horizon is not None:
+        horizon = np.asarray(horizon, dtype=float).reshape(n, -1)
+
+    annual_energy = np.empty(n)
+    hourly_power = None
+    if hourly:
+        if out_dir is not None:
+            out_dir = Path(out_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            hourly_power = open_memmap(out_dir / 'hourly.npy', mode='w+', dtype=np.float32, shape=(n, HOURS_PER_YEAR))
+        else:
+            hourly_power = np.empty((n, HOURS_PER_YEAR), dtype=np.float32)
+
+    step = max(chunk_elements // HOURS_PER_YEAR, 1)
+    chunks = [slice(start, min(start + step, n)) for start in range(0, n, step)]
+
+    def task(chunk):
+        return (lats[chunk], lons[chunk], tilt[chunk], azimuth[chunk], np.ascontiguousarray(daily_irradiance[chunk]),
+                panel_efficiency, panel_area, albedo, losses, hourly, None if horizon is None else horizon[chunk])
+
+    def store(chunk, result):
+        annual_energy[chunk] = result[0]
+        if hourly:
+            hourly_power[chunk] = result[1]
+
+    if max_workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            store(chunk, _simulate_chunk(*task(chunk)))
+    else:
+        max_workers = max_workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # Bounded number of chunks in flight, collected in submission order
+            pending = []
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(_simulate_chunk, *task(chunk))))
+                while len(pending) >= 2 * max_workers:
+                    store(*_result(pending.pop(0)))
+            while pending:
+                store(*_result(pending.pop(0)))
+
+    if out_dir is not None and hourly:
+        hourly_power.flush()
+    return annual_energy, hourly_power
+
+
+def _result(item):
+    chunk, future = item
+    return chunk, future.result()
+
+
+def simulate_terrain_grid(grid, monthly=False, year=None, mounting='terrain', shading=False, elevation_source=None,
+                          **kwargs):
+    """
+    Simulate a year of hourly production on every point of a TerrainGrid.
+
+    Parameters:
+    - grid: TerrainGrid with slope, aspect and irradiance (e.g. from get_energy_production_grid)
+    - monthly: Use monthly irradiance from the irradiance cube instead of the yearly mean
+    - year: Year read from the cube when monthly (default: mean of every year)
+    - mounting: 'terrain' (panels lie on the ground: tilt is the slope and azimuth the aspect, i.e. the
+      downslope direction clockwise from north) or 'optimal' (tilt |lat| facing the equator)
+    - shading: Account for the terrain horizon, including the terrain around the grid (see horizon.padded_horizon)
+    - elevation_source: ElevationSource of that surrounding terrain (default: as in get_terrain_grid)
+    - kwargs: Options of simulate_pv
+
+    Returns:
+    - annual_energy: kWh per year with the grid's shape
+    - hourly: (points, 8760) float32 W in row-major grid order, or None
+    """
+    if monthly:
+        from .irradiance_cube import load_irradiance_cube
+        irradiance = load_irradiance_cube().interpolate(grid.lat_grid, grid.lon_grid, year=year).reshape(grid.size, 12)
+    else:
+        irradiance = grid.irradiance.ravel()
+
+    if mounting == 'terrain':
+        # A plane facing its downslope direction has its normal tilted towards it, which is the panel azimuth
+        kwargs.setdefault('tilt', grid.slope.ravel())
+        kwargs.setdefault('azimuth', grid.aspect.ravel())
+    elif mounting != 'optimal':
+        raise ValueError(f"Unknown mounting: {mounting}")
+
+    if shading:
+        from .horizon import padded_horizon
+        kwargs.setdefault('horizon', padded_horizon(grid, elevation_source).reshape(grid.size, -1))
+
+    annual_energy, hourly = simulate_pv(grid['latitude'], grid['longitude'], irradiance, **kwargs)
+    return annual_energy.reshape(grid.shape), hourly
+
+
+if __name__ == '__main__':
+    import time
+
+    from .elevation_sources import OpenElevationSource
+    from .get_energy import get_energy_production_grid
+    from .stub_servers import StubServer
+
+    # A 2 km x 2 km assessment at 100 m, as in the Viabilidad view
+    lat, lon, half_side = -25.5, -70.5, 1 / 111
+    with StubServer() as server:
+        grid = get_energy_production_grid(lat - half_side, lat + half_side, lon - half_side, lon + half_side,
+                                          resolution=100,
+                                          elevation_source=OpenElevationSource(url=server.elevation_url, cache=False))
+
+    for max_workers in (1, None):
+        start = time.perf_counter()
+        annual_energy, hourly = simulate_terrain_grid(grid, hourly=True, max_workers=max_workers)
+        print(f"{grid.size} points x {HOURS_PER_YEAR} h with max_workers={max_workers}: "
+              f"{time.perf_counter() - start:.2f} s, mean {annual_energy.mean():.1f} kWh/year per m², "
+              f"peak hour {hourly.max():.0f} W")
+
+    # Panels on planes facing each cardinal direction: equator-facing (north here) must produce the most
+    from .slope_aspect_engine import METERS_PER_DEGREE, compute_slope_aspect
+    from .terrain_grid import TerrainGrid
+
+    north, east = np.meshgrid(np.arange(8) * 100.0, np.arange(8) * 100.0, indexing='ij')
+    plane_lats = -30 + np.arange(8) * 100 / METERS_PER_DEGREE
+    plane_lons = -70 + np.arange(8) * 100 / METERS_PER_DEGREE / np.cos(np.radians(-30))
+    for name, plane in (('north', -north), ('east', -east), ('south', north), ('west', east)):
+        elevation = 0.4 * plane
+        slope, aspect = compute_slope_aspect(elevation, plane_lats, plane_lons)
+        plane_grid = TerrainGrid(plane_lats, plane_lons, elevation=elevation, slope=slope, aspect=aspect,
+                                 irradiance=np.full(elevation.shape, 5.5))
+        annual_energy, _ = simulate_terrain_grid(plane_grid)
+        print(f"{name}-facing {slope[4, 4]:.0f}° slope at -30°: aspect {aspect[4, 4]:.0f}°, "
+              f"{annual_energy[4, 4]:.0f} kWh/year per m²")
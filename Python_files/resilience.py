@@ -0,0 +1,206 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while an upstream is down.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds. It then lets a single trial call
+    through (half-open): a success closes it again, a failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                self._trial_in_flight = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class RetryBudget:
+    """
+    Cap retries to a fraction of the traffic so retries cannot snowball when the upstream struggles.
+
+    Every first attempt deposits `ratio` tokens, every retry withdraws one.
+    `min_tokens` retries are always allowed so low traffic can still retry.
+    """
+
+    def __init__(self, ratio=0.2, min_tokens=10):
+        self.ratio = ratio
+        self.tokens = float(min_tokens)
+        self.max_tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.max_tokens += self.ratio
+            self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    Parameters:
+    - max_attempts: Attempts per call, the first one included
+    - base_delay: Backoff before the first retry (s)
+    - max_delay: Upper bound of the backoff (s)
+    - budget: Shared RetryBudget, or None for unlimited retries
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.2, max_delay=5.0, budget=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def hedged_call(fn, executor, hedge_delay=None):
+    """
+    Call `fn`, starting a duplicate call if the first one has not answered after `hedge_delay` seconds.
+
+    The first successful result wins; the call fails only if every copy fails.
+
+    Returns:
+    - (result, hedged) where `hedged` tells whether a duplicate was sent
+    """
+    if hedge_delay is None:
+        return fn(), False
+
+    primary = executor.submit(fn)
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result(), False
+
+    pending = {primary, executor.submit(fn)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), True
+            error = future.exception()
+    raise error
+
+
+class ResilientCaller:
+    """
+    Run calls to one upstream with retries, hedging and a circuit breaker, and count what happened.
+
+    The retry budget and hedging executor should be shared by every caller of
+    an upstream (see open_elevation.get_retry_budget and get_hedge_executor):
+    a budget private to a short-lived caller is always full and never caps
+    retries. When hedging is enabled without an `executor`, the caller owns
+    one and close() shuts it down.
+
+    Parameters:
+    - retry_policy: RetryPolicy (default: 3 attempts with a 20% retry budget of this caller)
+    - circuit_breaker: CircuitBreaker, or None to disable it
+    - hedge_delay: Seconds before sending a duplicate request, or None to disable hedging
+    - max_hedges: Maximum number of concurrent primary + hedge calls of an owned executor
+    - executor: Shared ThreadPoolExecutor to run hedged calls on
+    """
+
+    def __init__(self, retry_policy=None, circuit_breaker=None, hedge_delay=None, max_hedges=16, executor=None):
+        self.retry_policy = retry_policy or RetryPolicy(budget=RetryBudget())
+        self.circuit_breaker = circuit_breaker
+        self.hedge_delay = hedge_delay
+        self._owns_executor = hedge_delay is not None and executor is None
+        if self._owns_executor:
+            executor = ThreadPoolExecutor(max_workers=max_hedges)
+        self._executor = executor if hedge_delay is not None else None
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'retries': 0, 'hedges': 0, 'rejected': 0}
+
+    def close(self):
+        """Shut down the hedging executor if this caller owns it."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+            self._owns_executor = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def call(self, fn):
+        policy = self.retry_policy
+        self._count('calls')
+        if policy.budget is not None:
+            policy.budget.deposit()
+
+        for attempt in range(policy.max_attempts):
+            if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+                self._count('rejected')
+                self._count('failures')
+                raise CircuitOpenError("Upstream circuit breaker is open")
+            try:
+                result, hedged = hedged_call(fn, self._executor, self.hedge_delay)
+            except Exception:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure()
+                last_attempt = attempt == policy.max_attempts - 1
+                if last_attempt or (policy.budget is not None and not policy.budget.withdraw()):
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                time.sleep(policy.backoff(attempt))
+            else:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_success()
+                if hedged:
+                    self._count('hedges')
+                return result
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+
+from .slope_aspect_engine import METERS_PER_DEGREE
+from .terrain_grid import COLUMN_NAMES, TerrainGrid
+
+ENERGY_COLUMN = COLUMN_NAMES['energy']
+
+
+def _grid_shape(lats):
+    """
+    (rows, cols) of points listed row by row from a regular grid, as written by TerrainGrid.to_dataframe.
+
+    The number of columns is the length of the first run of equal latitudes.
+    """
+    n = lats.size
+    changes = np.flatnonzero(lats != lats[0])
+    n_cols = changes[0] if changes.size else n
+    if n % n_cols:
+        raise ValueError("Points do not form a regular grid in row-major order")
+    return n // n_cols, n_cols
+
+
+def _area_mask(values, shape, cell_area, min_area, area_quantile):
+    """
+    Points inside a contiguous region of at least `min_area` m² whose values are all
+    at or above the `area_quantile` quantile, and the area (m²) of each point's region.
+    """
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return np.zeros(values.size, dtype=bool), np.zeros(values.size)
+    # np.partition finds the quantile in linear time
+    position = int(area_quantile * (finite.size - 1))
+    threshold = np.partition(finite, position)[position]
+
+    labels, n_labels = ndimage.label((values >= threshold).reshape(shape))
+    labels = labels.ravel()
+    region_area = np.bincount(labels, minlength=n_labels + 1) * cell_area
+    region_area[0] = 0
+    area = region_area[labels]
+    return area >= min_area, area
+
+
+def top_k_sites(data, k=5, min_separation=200.0, min_area=None, area_quantile=0.9, value_column=ENERGY_COLUMN):
+    """
+    Best installation sites of an energy production grid.
+
+    Selection is greedy non-maximum suppression: points are visited from the
+    highest value down and kept unless a kept site lies within
+    `min_separation` meters. Candidates are taken in batches: the 4k best
+    points are split off with np.argpartition and sorted, and while
+    suppression leaves fewer than k sites the next batch, twice as large, is
+    split off the points not considered yet, so each point is sorted at most
+    once and the sorted points outnumber the visited ones by at most the last
+    batch. Kept sites are bucketed in a grid of `min_separation`-sized cells, so each
+    candidate is checked against the nine buckets around it only. The usual
+    cost is one linear partition; every extra batch partitions the remaining
+    points again, at most log2(n / 4k) times.
+
+    With `min_area`, a site must lie in a contiguous region of at least that
+    many m² in which every point is at or above the `area_quantile` quantile
+    of the values, e.g. room for a whole array rather than an isolated spike.
+    Regions come from scipy.ndimage.label on the grid, so the points must form
+    a regular grid listed row by row (as from get_energy_production_df).
+
+    Parameters:
+    - data: TerrainGrid or DataFrame with latitude, longitude and `value_column` columns
+    - k: Number of sites
+    - min_separation: Minimum distance between two sites (m)
+    - min_area: Minimum contiguous area (m²) around a site, None to disable
+    - area_quantile: Quantile of the values that defines the regions for min_area
+    - value_column: Column to maximise
+
+    Returns:
+    - pandas.DataFrame with rank, latitude, longitude and `value_column` of up to k sites
+      (plus 'area (m²)' of their region with min_area), best first
+    """
+    if isinstance(data, TerrainGrid):
+        lats, lons, values = data['latitude'], data['longitude'], np.array(data[value_column], dtype=float)
+    else:
+        lats = data['latitude'].to_numpy(dtype=float)
+        lons = data['longitude'].to_numpy(dtype=float)
+        values = data[value_column].to_numpy(dtype=float, copy=True)
+    values[np.isnan(values)] = -np.inf
+    n = values.size
+
+    # Local equirectangular projection in meters
+    cos_lat = np.cos(np.radians(np.mean(lats))) if n else 1.0
+    y = lats * METERS_PER_DEGREE
+    x = lons * METERS_PER_DEGREE * cos_lat
+
+    area = None
+    if min_area is not None and n:
+        shape = data.shape if isinstance(data, TerrainGrid) else _grid_shape(lats)
+        lat_axis, lon_axis = lats[::shape[1]], lons[:shape[1]]
+        cell_y = abs(lat_axis[-1] - lat_axis[0]) / max(shape[0] - 1, 1) * METERS_PER_DEGREE
+        cell_x = abs(lon_axis[-1] - lon_axis[0]) / max(shape[1] - 1, 1) * METERS_PER_DEGREE * cos_lat
+        large_enough, area = _area_mask(values, shape, cell_y * cell_x, min_area, area_quantile)
+        values[~large_enough] = -np.inf
+
+    remaining = np.flatnonzero(np.isfinite(values))
+    selected = []
+    buckets = {}
+    batch_size = 4 * k
+    while len(selected) < k and remaining.size:
+        # Split the best batch_size points off the candidates not considered yet and sort that slice only
+        if batch_size < remaining.size:
+            order = np.argpartition(-values[remaining], batch_size - 1)
+            pool, remaining = remaining[order[:batch_size]], remaining[order[batch_size:]]
+        else:
+            pool, remaining = remaining, remaining[:0]
+        # Ties within the slice are broken by position in the grid
+        pool = pool[np.lexsort((pool, -values[pool]))]
+
+        for index in pool:
+            if min_separation > 0:
+                bx, by = int(x[index] // min_separation), int(y[index] // min_separation)
+                if any((x[index] - x[j]) ** 2 + (y[index] - y[j]) ** 2 < min_separation ** 2
+                       for dx in (-1, 0, 1) for dy in (-1, 0, 1) for j in buckets.get((bx + dx, by + dy), ())):
+                    continue
+                buckets.setdefault((bx, by), []).append(index)
+            selected.append(index)
+            if len(selected) == k:
+                break
+        batch_size *= 2
+
+    selected = np.array(selected, dtype=int)
+    sites = pd.DataFrame({
+        'rank': np.arange(1, selected.size + 1),
+        'latitude': lats[selected],
+        'longitude': lons[selected],
+        value_column: values[selected],
+    })
+    if area is not None:
+        sites['area (m²)'] = area[selected]
+    return sites
+
+
+if __name__ == '__main__':
+    import time
+
+    # Smooth random field on a 2000 x 2000 grid at ~100 m
+    rng = np.random.default_rng(0)
+    size = 2000
+    lats = -26 + np.arange(size) / 1110
+    lons = -71 + np.arange(size) / 1110
+    field = ndimage.gaussian_filter(rng.normal(size=(size, size)), 8)
+    grid = TerrainGrid(lats, lons, energy=1000 + 1000 * field)
+
+    for min_area in (None, 50_000):
+        start = time.perf_counter()
+        sites = top_k_sites(grid, k=10, min_separation=1000, min_area=min_area)
+        print(f"{grid.size:,d} points, min_area={min_area}: {time.perf_counter() - start:.3f} s")
+        print(sites.to_string(index=False))
@@ -0,0 +1,156 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+METERS_PER_DEGREE = 111000
+DEFAULT_TILE_SIZE = 1024
+
+
+def cell_sizes(lats, lons):
+    """
+    Cell sizes in meters of a regular lat/lon grid.
+
+    Returns:
+    - cell_size_y: North-south cell size (scalar)
+    - cell_size_x: East-west cell size of every row (1-D array, shrinks with cos(latitude))
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    cell_size_y = (lats[-1] - lats[0]) / (lats.size - 1) * METERS_PER_DEGREE
+    cell_size_x = (lons[-1] - lons[0]) / (lons.size - 1) * METERS_PER_DEGREE * np.cos(np.radians(lats))
+    return cell_size_y, cell_size_x
+
+
+def _slope_aspect_block(block, cell_size_y, cell_size_x, crop):
+    """
+    Slope and aspect (degrees) of an elevation block that includes its halo.
+    `crop` are the (row, column) slices that remove the halo again.
+
+    Aspect is the downslope direction, clockwise from north: a plane falling
+    towards the north faces 0°, east 90°, south 180° and west 270°. Rows
+    grow northwards, so dy is the northward rise and dx the eastward rise.
+    """
+    block = np.asarray(block, dtype=float)
+    dy = np.gradient(block, cell_size_y, axis=0)
+    dx = np.gradient(block, axis=1) / cell_size_x[:, None]
+    dy, dx = dy[crop], dx[crop]
+
+    slope = np.degrees(np.arctan(np.hypot(dx, dy)))
+    aspect = np.mod(np.degrees(np.arctan2(-dx, -dy)), 360)
+    return slope, aspect
+
+
+def _tiles(shape, tile_size):
+    n_rows, n_cols = shape
+    for row0 in range(0, n_rows, tile_size):
+        for col0 in range(0, n_cols, tile_size):
+            yield row0, min(row0 + tile_size, n_rows), col0, min(col0 + tile_size, n_cols)
+
+
+def _tile_task(elevation, cell_size_y, cell_size_x, row0, row1, col0, col1):
+    # One-cell halo so central differences at tile edges match the untiled result
+    n_rows, n_cols = elevation.shape
+    halo_row0, halo_row1 = max(row0 - 1, 0), min(row1 + 1, n_rows)
+    halo_col0, halo_col1 = max(col0 - 1, 0), min(col1 + 1, n_cols)
+    block = np.array(elevation[halo_row0:halo_row1, halo_col0:halo_col1])
+    crop = (slice(row0 - halo_row0, row0 - halo_row0 + row1 - row0),
+            slice(col0 - halo_col0, col0 - halo_col0 + col1 - col0))
+    return block, cell_size_y, cell_size_x[halo_row0:halo_row1], crop
+
+
+def compute_slope_aspect(elevation, lats, lons, tile_size=DEFAULT_TILE_SIZE, max_workers=1, out_dir=None,
+                         dtype=np.float64):
+    """
+    Compute slope and aspect of an elevation grid in fixed-size tiles.
+
+    Each tile is processed together with a one-cell halo, so the result is
+    identical to running np.gradient over the whole grid. The east-west cell
+    size is computed for every row. Tiles can be spread over several processes
+    and only a bounded number of them is in flight at any time, so `elevation`
+    can be a memory-mapped DEM much larger than RAM when `out_dir` is used.
+
+    Parameters:
+    - elevation: 2-D elevation array (m), rows along `lats` and columns along `lons`
+    - lats, lons: 1-D regularly spaced coordinate axes
+    - tile_size: Side of a tile in cells
+    - max_workers: Number of worker processes (1 computes in-process, None uses every core)
+    - out_dir: If given, slope and aspect are written to memory-mapped slope.npy/aspect.npy files there
+    - dtype: Output dtype
+
+    Returns:
+    - slope, aspect: 2-D arrays in degrees, aspect being the downslope direction clockwise from north
+      (0 = north-facing, 90 = east, 180 = south, 270 = west)
+    """
+    shape = elevation.shape
+    cell_size_y, cell_size_x = cell_sizes(lats, lons)
+
+    if out_dir is not None:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        slope = open_memmap(out_dir / 'slope.npy', mode='w+', dtype=dtype, shape=shape)
+        aspect = open_memmap(out_dir / 'aspect.npy', mode='w+', dtype=dtype, shape=shape)
+    else:
+        slope = np.empty(shape, dtype=dtype)
+        aspect = np.empty(shape, dtype=dtype)
+
+    tiles = list(_tiles(shape, tile_size))
+    if max_workers == 1 or len(tiles) == 1:
+        for row0, row1, col0, col1 in tiles:
+            tile_slope, tile_aspect = _slope_aspect_block(
+                *_tile_task(elevation, cell_size_y, cell_size_x, row0, row1, col0, col1))
+            slope[row0:row1, col0:col1] = tile_slope
+            aspect[row0:row1, col0:col1] = tile_aspect
+    else:
+        max_workers = max_workers or os.cpu_count()
+        max_in_flight = 2 * max_workers
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            for tile in tiles:
+                pending[tile] = executor.submit(_slope_aspect_block,
+                                                *_tile_task(elevation, cell_size_y, cell_size_x, *tile))
+                if len(pending) >= max_in_flight:
+                    _collect(pending, slope, aspect, keep=max_in_flight // 2)
+            _collect(pending, slope, aspect, keep=0)
+
+    if out_dir is not None:
+        slope.flush()
+        aspect.flush()
+    return slope, aspect
+
+
+def _collect(pending, slope, aspect, keep):
+    # Write finished tiles in submission order until only `keep` remain in flight
+    while len(pending) > keep:
+        (row0, row1, col0, col1), future = next(iter(pending.items()))
+        tile_slope, tile_aspect = future.result()
+        slope[row0:row1, col0:col1] = tile_slope
+        aspect[row0:row1, col0:col1] = tile_aspect
+        del pending[(row0, row1, col0, col1)]
+
+
+if __name__ == '__main__':
+    import time
+
+    lats = np.linspace(-26, -25, 6000)
+    lons = np.linspace(-71, -70, 6000)
+    elevation = 600 + 300 * np.sin(40 * lons)[None, :] * np.cos(40 * lats)[:, None]
+
+    start = time.perf_counter()
+    reference = compute_slope_aspect(elevation, lats, lons, tile_size=elevation.shape[0])
+    print(f"Single block: {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    tiled = compute_slope_aspect(elevation, lats, lons, tile_size=1024, max_workers=None)
+    print(f"Tiled over all cores: {time.perf_counter() - start:.2f} s, "
+          f"identical: {np.array_equal(reference[0], tiled[0]) and np.array_equal(reference[1], tiled[1])}")
+
+    # Planes falling towards each cardinal direction, tiled so that they cross tile edges
+    north, east = np.meshgrid(np.arange(64) * 100.0, np.arange(64) * 100.0, indexing='ij')
+    plane_lats = -30 + np.arange(64) * 100 / METERS_PER_DEGREE
+    plane_lons = -70 + np.arange(64) * 100 / METERS_PER_DEGREE / np.cos(np.radians(-30))
+    for name, plane in (('north', -north), ('east', -east), ('south', north), ('west', east)):
+        _, aspect = compute_slope_aspect(0.2 * plane, plane_lats, plane_lons, tile_size=16)
+        print(f"{name}-facing plane: aspect {np.median(aspect):.1f}°")
@@ -0,0 +1,236 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .http_replay import Cassette, request_key
+
+ELEVATION_PATH = '/api/v1/lookup'
+POWER_PATH = '/api/temporal/monthly/point'
+
+
+def synthetic_elevation(lats, lons):
+    """
+    Deterministic synthetic terrain (m) used by the stand-in servers.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    return 600 + 300 * np.sin(40 * lons) * np.cos(40 * lats) + 80 * np.sin(230 * lats + 170 * lons)
+
+
+def synthetic_monthly_irradiance(lat, lon, month):
+    """
+    Deterministic synthetic monthly irradiance (kWh/m²/day) with a hemisphere-aware seasonal cycle.
+    """
+    mean = 6.2 - 4.0 * (abs(lat) / 60) ** 1.5 + 0.3 * np.sin(np.radians(3 * lon))
+    # Southern summer peaks in December, northern summer in June
+    phase = 0 if lat < 0 else 6
+    seasonal = 0.35 * np.cos(2 * np.pi * (month - 12 - phase) / 12) * min(abs(lat) / 30, 1.5)
+    return float(mean * (1 + seasonal))
+
+
+def synthetic_power_response(lat, lon, start_year, end_year):
+    """Body of a NASA POWER monthly point response built from synthetic_monthly_irradiance."""
+    values = {}
+    for year in range(start_year, end_year + 1):
+        months = [round(synthetic_monthly_irradiance(lat, lon, month), 2) for month in range(1, 13)]
+        for month, value in enumerate(months, start=1):
+            values[f"{year}{month:02d}"] = value
+        values[f"{year}13"] = round(float(np.mean(months)), 2)
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+        'properties': {'parameter': {'ALLSKY_SFC_SW_DWN': values}},
+    }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method, body):
+        server = self.server
+        path = urlsplit(self.path).path.rstrip('/')
+        with server.stats_lock:
+            server.request_count += 1
+            fail = server.rng.random() < server.error_rate
+            delay = server.rng.uniform(*server.latency)
+            if server.rng.random() < server.tail_rate:
+                delay += server.tail_latency
+
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            with server.stats_lock:
+                server.error_count += 1
+            self._send_json(503, {'error': 'Injected failure'})
+            return
+
+        if server.cassette is not None:
+            entry = server.cassette.get(request_key(method, self.path, body))
+            if entry is not None:
+                self._send_json(entry['status'], Cassette.body_of(entry))
+                return
+            if server.replay_only:
+                self._send_json(404, {'error': 'Request not recorded'})
+                return
+
+        if method == 'POST' and path == ELEVATION_PATH:
+            locations = json.loads(body).get('locations', [])
+            lats = [point['latitude'] for point in locations]
+            lons = [point['longitude'] for point in locations]
+            with server.stats_lock:
+                server.location_count += len(locations)
+            self._send_json(200, {'results': [
+                {'latitude': lat, 'longitude': lon, 'elevation': float(elevation)}
+                for lat, lon, elevation in zip(lats, lons, synthetic_elevation(lats, lons))
+            ]})
+        elif method == 'GET' and path == POWER_PATH:
+            query = parse_qs(urlsplit(self.path).query)
+            self._send_json(200, synthetic_power_response(
+                float(query['latitude'][0]), float(query['longitude'][0]),
+                int(query['start'][0]), int(query['end'][0])))
+        else:
+            self._send_json(404, {'error': f'Unknown endpoint {path}'})
+
+    def do_GET(self):
+        self._handle('GET', b'')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._handle('POST', self.rfile.read(length))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """
+    Local stand-in for the open-elevation and NASA POWER APIs.
+
+    Serves `POST /api/v1/lookup` and `GET /api/temporal/monthly/point` on a free
+    localhost port. Responses come from a recorded cassette when one is given
+    and from deterministic synthetic data otherwise. Latency and failures can be
+    injected to load-test the clients offline.
+
+    Parameters:
+    - latency: Seconds added to every response, or a (min, max) range drawn uniformly
+    - error_rate: Fraction of requests answered with HTTP 503
+    - tail_rate: Fraction of requests delayed by an extra `tail_latency` seconds (slow outliers)
+    - cassette: Cassette or path of recorded responses to serve
+    - replay_only: Answer 404 for requests missing from the cassette instead of synthesizing them
+    - seed: Seed of the latency and failure draws
+    - host, port: Address to bind (port 0 picks a free port)
+
+    Example:
+        with StubServer(latency=0.05) as server:
+            fetch_elevations(lats, lons, url=server.elevation_url)
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, tail_rate=0.0, tail_latency=1.0, cassette=None, replay_only=False,
+                 seed=0, host='127.0.0.1', port=0):
+        self._httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stats_lock = threading.Lock()
+        self._httpd.rng = random.Random(seed)
+        self._httpd.cassette = cassette if cassette is None or isinstance(cassette, Cassette) else Cassette(cassette)
+        self._httpd.replay_only = replay_only
+        self.latency = latency
+        self.error_rate = error_rate
+        self._httpd.tail_rate = tail_rate
+        self._httpd.tail_latency = tail_latency
+        self.reset_stats()
+        self._thread = None
+
+    @property
+    def latency(self):
+        return self._httpd.latency
+
+    @latency.setter
+    def latency(self, value):
+        self._httpd.latency = tuple(value) if isinstance(value, (tuple, list)) else (value, value)
+
+    @property
+    def error_rate(self):
+        return self._httpd.error_rate
+
+    @error_rate.setter
+    def error_rate(self, value):
+        self._httpd.error_rate = value
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def elevation_url(self):
+        return self.base_url + ELEVATION_PATH
+
+    @property
+    def power_url(self):
+        return self.base_url + POWER_PATH
+
+    @property
+    def request_count(self):
+        return self._httpd.request_count
+
+    @property
+    def error_count(self):
+        return self._httpd.error_count
+
+    @property
+    def location_count(self):
+        return self._httpd.location_count
+
+    def reset_stats(self):
+        with self._httpd.stats_lock:
+            self._httpd.request_count = 0
+            self._httpd.error_count = 0
+            self._httpd.location_count = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve synthetic or recorded open-elevation / NASA POWER responses")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--tail-rate', type=float, default=0.0)
+    parser.add_argument('--tail-latency', type=float, default=1.0)
+    parser.add_argument('--cassette', default=None)
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency, error_rate=args.error_rate, tail_rate=args.tail_rate,
+                        tail_latency=args.tail_latency, cassette=args.cassette, port=args.port)
+    print(f"Serving {server.elevation_url} and {server.power_url}")
+    server._httpd.serve_forever()
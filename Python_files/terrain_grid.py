@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+# DataFrame column name of every grid field
+COLUMN_NAMES = {
+    'elevation': 'elevation',
+    'slope': 'slope',
+    'aspect': 'aspect',
+    'irradiance': 'irradiance',
+    'energy': 'Energy Production (W)',
+    'shading': 'shading',
+}
+FIELDS = tuple(COLUMN_NAMES)
+
+
+class TerrainGrid:
+    """
+    Terrain analysis results on a regular lat/lon grid.
+
+    Coordinates are stored once as 1-D axes; every field is a 2-D float array of
+    shape (len(lats), len(lons)) with rows along latitude and columns along
+    longitude. Full coordinate grids and DataFrames are only built on request.
+
+    Parameters:
+    - lats: 1-D array of latitudes (one per row)
+    - lons: 1-D array of longitudes (one per column)
+    - elevation, slope, aspect, irradiance, energy, shading: Optional 2-D arrays
+    - degraded: Optional 2-D boolean mask of points computed from synthetic elevations
+
+    Fields can be read as attributes (grid.slope) or, flattened like a DataFrame
+    column, by their column name (grid['slope'], grid['latitude'],
+    grid['Energy Production (W)']).
+    """
+
+    def __init__(self, lats, lons, elevation=None, slope=None, aspect=None, irradiance=None, energy=None,
+                 shading=None, degraded=None):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.elevation = elevation
+        self.slope = slope
+        self.aspect = aspect
+        self.irradiance = irradiance
+        self.energy = energy
+        self.shading = shading
+        self.degraded = degraded
+
+    def __setattr__(self, name, value):
+        if name in FIELDS and value is not None:
+            value = np.asarray(value, dtype=float)
+            if value.shape != (self.lats.size, self.lons.size):
+                raise ValueError(f"{name} has shape {value.shape}, expected {(self.lats.size, self.lons.size)}")
+        super().__setattr__(name, value)
+
+    @property
+    def shape(self):
+        return self.lats.size, self.lons.size
+
+    @property
+    def size(self):
+        return self.lats.size * self.lons.size
+
+    @property
+    def lat_grid(self):
+        """Read-only 2-D latitude view (no copy)."""
+        return np.broadcast_to(self.lats[:, None], self.shape)
+
+    @property
+    def lon_grid(self):
+        """Read-only 2-D longitude view (no copy)."""
+        return np.broadcast_to(self.lons[None, :], self.shape)
+
+    @property
+    def degraded_points(self):
+        return 0 if self.degraded is None else int(np.count_nonzero(self.degraded))
+
+    def available_fields(self):
+        return [name for name in FIELDS if getattr(self, name) is not None]
+
+    def __getitem__(self, column):
+        if column == 'latitude':
+            return self.lat_grid.ravel()
+        if column == 'longitude':
+            return self.lon_grid.ravel()
+        for name, column_name in COLUMN_NAMES.items():
+            if column == column_name and getattr(self, name) is not None:
+                return getattr(self, name).ravel()
+        raise KeyError(column)
+
+    def __len__(self):
+        return self.size
+
+    def window(self, rows=slice(None), cols=slice(None)):
+        """
+        Return a TerrainGrid over a rectangular window whose fields are views of this grid.
+        """
+        kwargs = {name: getattr(self, name)[rows, cols] for name in self.available_fields()}
+        if self.degraded is not None:
+            kwargs['degraded'] = self.degraded[rows, cols]
+        return TerrainGrid(self.lats[rows], self.lons[cols], **kwargs)
+
+    def crop(self, min_lat, max_lat, min_lon, max_lon):
+        """Return a view of the grid restricted to a bounding box."""
+        rows = np.flatnonzero((self.lats >= min_lat) & (self.lats <= max_lat))
+        cols = np.flatnonzero((self.lons >= min_lon) & (self.lons <= max_lon))
+        if rows.size == 0 or cols.size == 0:
+            return self.window(slice(0, 0), slice(0, 0))
+        return self.window(slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+
+    def to_dataframe(self, fields=None) -> pd.DataFrame:
+        """
+        Build a flat DataFrame with latitude, longitude and the requested fields.
+
+        Parameters:
+        - fields: Field names to include (default: every available field)
+        """
+        fields = self.available_fields() if fields is None else fields
+        data = {'latitude': self['latitude'], 'longitude': self['longitude']}
+        for name in fields:
+            data[COLUMN_NAMES[name]] = getattr(self, name).ravel()
+        return pd.DataFrame(data)
+
+    def nbytes(self):
+        return self.lats.nbytes + self.lons.nbytes + sum(getattr(self, name).nbytes for name in self.available_fields())
+
+    def __repr__(self):
+        return f"TerrainGrid(shape={self.shape}, fields={self.available_fields()})"
@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+
+from .get_energy import get_energy_production_grid
+from .get_slope_aspect import grid_shape
+
+DEFAULT_RESOLUTIONS = (30, 90, 270, 1000)  # meters
+
+
+class TerrainPyramid:
+    """
+    Multi-resolution slope/aspect/energy levels over a fixed area.
+
+    Each level is a TerrainGrid computed by the energy pipeline at one
+    resolution. Queries pick the finest level whose number of points inside the
+    requested box fits the point budget, so wide views are served from coarse
+    levels and full detail is only computed for small, zoomed-in windows.
+
+    Parameters:
+    - min_lat, max_lat, min_lon, max_lon: Extent covered by the pyramid
+    - resolutions: Level resolutions in meters
+    - max_windows: Number of on-demand windows kept for levels not built over the whole extent
+    - grid_kwargs: Extra arguments forwarded to get_energy_production_grid
+      (elevation_source, max_workers, ...)
+    """
+
+    def __init__(self, min_lat, max_lat, min_lon, max_lon, resolutions=DEFAULT_RESOLUTIONS, max_windows=16,
+                 **grid_kwargs):
+        self.bounds = (min_lat, max_lat, min_lon, max_lon)
+        self.resolutions = tuple(sorted(resolutions))
+        self.max_windows = max_windows
+        self.grid_kwargs = grid_kwargs
+        self.levels = {}
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def level_points(self, resolution, min_lat=None, max_lat=None, min_lon=None, max_lon=None):
+        """Number of points a level has inside a box (default: the whole extent)."""
+        box = self._clip_box(min_lat, max_lat, min_lon, max_lon)
+        lat_samples, lon_samples = grid_shape(*box, resolution)
+        return lat_samples * lon_samples
+
+    def _clip_box(self, min_lat=None, max_lat=None, min_lon=None, max_lon=None):
+        b_min_lat, b_max_lat, b_min_lon, b_max_lon = self.bounds
+        return (b_min_lat if min_lat is None else max(min_lat, b_min_lat),
+                b_max_lat if max_lat is None else min(max_lat, b_max_lat),
+                b_min_lon if min_lon is None else max(min_lon, b_min_lon),
+                b_max_lon if max_lon is None else min(max_lon, b_max_lon))
+
+    def build(self, max_points=None):
+        """
+        Compute levels over the whole extent, coarsest first.
+
+        Parameters:
+        - max_points: Only build levels with at most this many points (default: all levels)
+        """
+        for resolution in reversed(self.resolutions):
+            if max_points is None or self.level_points(resolution) <= max_points:
+                self.level(resolution)
+        return self
+
+    def level(self, resolution):
+        """Return the TerrainGrid of a level over the whole extent, computing it on first use."""
+        with self._lock:
+            grid = self.levels.get(resolution)
+        if grid is None:
+            grid = get_energy_production_grid(*self.bounds, resolution=resolution, **self.grid_kwargs)
+            with self._lock:
+                self.levels[resolution] = grid
+        return grid
+
+    def select_resolution(self, min_lat, max_lat, min_lon, max_lon, max_points=10000):
+        """
+        Finest level resolution with at most `max_points` points inside the box,
+        or the coarsest level if none fits.
+        """
+        for resolution in self.resolutions:
+            if self.level_points(resolution, min_lat, max_lat, min_lon, max_lon) <= max_points:
+                return resolution
+        return self.resolutions[-1]
+
+    def query(self, min_lat, max_lat, min_lon, max_lon, max_points=10000):
+        """
+        Return a TerrainGrid for a box at the most detailed level that fits the point budget.
+
+        Built levels are cropped without copying. Finer levels that were not built
+        over the whole extent are computed for the requested window only.
+        """
+        box = self._clip_box(min_lat, max_lat, min_lon, max_lon)
+        resolution = self.select_resolution(*box, max_points=max_points)
+
+        with self._lock:
+            grid = self.levels.get(resolution)
+            if grid is not None:
+                return grid.crop(*box)
+
+            key = (resolution,) + tuple(round(value, 6) for value in box)
+            window = self._windows.get(key)
+            if window is not None:
+                self._windows.move_to_end(key)
+                return window
+
+        window = get_energy_production_grid(*box, resolution=resolution, **self.grid_kwargs)
+        with self._lock:
+            self._windows[key] = window
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+        return window
+
+
+if __name__ == '__main__':
+    import time
+
+    pyramid = TerrainPyramid(-25.6, -25.4, -70.6, -70.4).build(max_points=20000)
+    for box, budget in [((-25.6, -25.4, -70.6, -70.4), 5000), ((-25.51, -25.49, -70.51, -70.49), 5000)]:
+        start = time.perf_counter()
+        grid = pyramid.query(*box, max_points=budget)
+        print(f"{box}: {grid.shape} grid in {time.perf_counter() - start:.3f} s")
@@ -1,7 +1,6 @@
 import streamlit as st
 import folium
 from streamlit_folium import folium_static, st_folium
-import pandas as pd
 import numpy as np
 from geopy.geocoders import Nominatim
 from folium.plugins import HeatMap
@@ -12,7 +11,11 @@ import base64
 from PIL import Image
 import io
 
-from Python_files.get_energy import get_energy_production_df, create_3_plots_st, create_information_plots
+from Python_files.get_energy import (get_energy_production_grid_coalesced, create_3_plots_st,
+                                     prerender_information_plots, render_information_plots)
+from Python_files.irradiance_refinement import get_default_refiner
+from Python_files.site_selection import top_k_sites
+from Python_files.terrain_grid import TerrainGrid
 
 def show_information():
     st.header("Potencial de Energía Solar por Propiedades del Terreno")
@@ -21,21 +24,21 @@ def show_information():
     latitude = st.slider("Latitud", min_value=-90, max_value=90, value=-45, 
                         help="Especifica la latitud para ver la orientación óptima de los paneles")
     
-    # Generate the plots
-    heatmap_fig, curves_fig = create_information_plots(mean_latitude=latitude)
+    # Generate the plots (cached per latitude, pre-rendered in the background at startup)
+    heatmap_png, curves_png = render_information_plots(mean_latitude=latitude)
     
     # Display both plots side by side
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Potencial de Energía Solar por Pendiente y Orientación")
-        st.pyplot(heatmap_fig)
+        st.image(heatmap_png, use_container_width=True)
     
     with col2:
         st.subheader("Efecto de la Pendiente en la Producción de Energía")
-        st.pyplot(curves_fig)
+        st.image(curves_png, use_container_width=True)
 
-terrain_df = pd.DataFrame()
+terrain_grid = None
 
 # Load configuration from settings.json
 try:
@@ -52,6 +55,10 @@ except FileNotFoundError:
         }
     }
 
+# Información plots are rendered on demand and cached; warming every latitude at start-up is opt-in
+if settings.get('prerender_information_plots', False):
+    prerender_information_plots()
+
 # Page configuration
 st.set_page_config(
     layout="wide", 
@@ -454,28 +461,42 @@ def get_location_info(lat, lon):
         return "Error al obtener información de ubicación"
 
 
+def radius_mask(grid, center_lat, center_lon, radius_km=2) -> np.ndarray:
+    radius_degree = radius_km / 111
+
+    # Calculate distances from center, broadcasting the latitude and longitude axes
+    distances = np.sqrt((grid.lats[:, None] - center_lat)**2 + (grid.lons[None, :] - center_lon)**2)
+    return distances <= radius_degree
+
+
 def generate_heatmap_data_in_radius(center_lat, center_lon, radius_km=2, num_points=200) -> list:
-    global terrain_df
+    global terrain_grid
     radius_degree = radius_km / 111
     
     min_lat, max_lat = center_lat + np.array([-radius_degree, radius_degree])
     min_lon, max_lon = center_lon + np.array([-radius_degree, radius_degree])
     
-    terrain_df = get_energy_production_df(min_lat, max_lat, min_lon, max_lon, resolution=100)
-    
-    # Calculate distances from center
-    distances = np.sqrt((terrain_df['latitude'] - center_lat)**2 + (terrain_df['longitude'] - center_lon)**2)
+    # Irradiance comes from the precomputed tiles. Refining it with live NASA POWER samples around each site is
+    # opt-in: it harvests in the background, so results for a site change while its refinement runs
+    refiner = get_default_refiner() if settings.get('refine_irradiance', False) else None
+    terrain_grid = get_energy_production_grid_coalesced(min_lat, max_lat, min_lon, max_lon, resolution=100,
+                                                        refiner=refiner)
     
     # Filter to only include points within the radius
-    filtered_terrain_df = terrain_df[distances <= radius_degree]
+    rows, cols = np.nonzero(radius_mask(terrain_grid, center_lat, center_lon, radius_km))
 
-    # Return a list of (latitude, longitude, intensity) tuples from filtered terrain_df
-    heat_data = []
-    for _, row in filtered_terrain_df.iterrows():
-        heat_data.append((row['latitude'], row['longitude'], row['Energy Production (W)']))
+    # Return a list of (latitude, longitude, intensity) tuples from the points inside the radius
+    heat_data = list(zip(terrain_grid.lats[rows].tolist(), terrain_grid.lons[cols].tolist(),
+                         terrain_grid.energy[rows, cols].tolist()))
     # print(*heat_data, sep='\n')
     return heat_data
 
+
+def top_k_sites_in_radius(grid, center_lat, center_lon, radius_km=2, **kwargs):
+    # The grid is shared between sessions, so points outside the radius are dropped on a copy
+    energy = np.where(radius_mask(grid, center_lat, center_lon, radius_km), grid.energy, np.nan)
+    return top_k_sites(TerrainGrid(grid.lats, grid.lons, energy=energy), **kwargs)
+
 def chat_with_azure_openai_image(prompt, image_data=None):
     # Create Azure OpenAI client
     client = openai.AzureOpenAI(
@@ -890,6 +911,19 @@ with col_content:
                 }
             ).add_to(heatmap)
             
+            # Mark the best installation spots inside the 2 km radius, at least 300 m apart
+            for rank, site_lat, site_lon, energy in top_k_sites_in_radius(
+                    terrain_grid, lat, lng, radius_km=2, k=5, min_separation=300).itertuples(index=False):
+                folium.Marker(
+                    [site_lat, site_lon],
+                    popup=f"Sitio #{rank}: {energy:.1f} W",
+                    icon=folium.Icon(color='green', icon='star')
+                ).add_to(heatmap)
+            
+            if terrain_grid.degraded_points:
+                st.warning(f"No se pudo obtener la elevación real de {terrain_grid.degraded_points} de "
+                           f"{terrain_grid.size} puntos; se usó un terreno sintético para ellos.")
+            
             # Show heat map
             st.markdown("<div class='center-map'>", unsafe_allow_html=True)
             folium_static(heatmap, width=900, height=400)
@@ -944,7 +978,7 @@ with col_content:
         
             # Display the 3 plots
             st.markdown("<h3 class='sub-header'>Análisis del Terreno y Potencial de Energía Solar</h3>", unsafe_allow_html=True)
-            create_3_plots_st(terrain_df)  # Assuming terrain_df is your DataFrame with the necessary data
+            create_3_plots_st(terrain_grid)  # TerrainGrid computed by generate_heatmap_data_in_radius
 
 
         else: